@@ -5,7 +5,7 @@ import argparse
 import os
 import sys
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import List
 
 from clang import cindex
 
@@ -15,15 +15,19 @@ from csig_core import (
     Location,
     Query,
     clang_c_include_path_args,
+    clear_levenshtein_cache,
     configure_libclang_from_env,
     iter_functions,
     levenshtein_distance,
     normalise_signature,
     parse_query,
+    rank_candidates,
     score_function,
+    use_clang_normaliser,
+    warmup_levenshtein,
 )
 from csig_db import fetch_candidates, init_db, open_db
-from csig_indexer import run_index
+from csig_indexer import needs_refresh, run_index
 
 # Compatibility export for tests that patch subprocess used in core helpers.
 subprocess = _core.subprocess
@@ -33,28 +37,6 @@ def default_db_path(root: str) -> str:
     return str(Path(root).resolve() / "csig.sqlite3")
 
 
-def rank_candidates(candidates: List[Dict[str, Any]], query: Query, top: int) -> List[Dict[str, Any]]:
-    scored: List[tuple[int, Dict[str, Any]]] = []
-    for row in candidates:
-        score = 0
-        if query.name:
-            score += levenshtein_distance(str(row["name"]), query.name)
-        if query.normalised_signature:
-            score += levenshtein_distance(str(row["signature_norm"]), query.normalised_signature)
-        scored.append((score, row))
-
-    scored.sort(
-        key=lambda item: (
-            item[0],
-            str(item[1]["name"]).lower(),
-            str(item[1]["path"]).lower(),
-            int(item[1]["line"]),
-            int(item[1]["column"]),
-        )
-    )
-    return [row for _, row in scored[: max(0, int(top))]]
-
-
 def _format_params(params: List[List[str]]) -> str:
     chunks: List[str] = []
     for item in params:
@@ -84,22 +66,30 @@ def _cmd_index(args: argparse.Namespace) -> int:
     print(f"Files failed: {summary['files_failed']}")
     print(f"Functions indexed: {summary['functions_total']}")
     print(f"Duration: {summary['duration_seconds']:.3f}s")
+    if summary.get("executor_error"):
+        print(f"Parser pool failed, unprocessed files are retried next run: {summary['executor_error']}")
     return 0
 
 
 def _cmd_search(args: argparse.Namespace) -> int:
+    clear_levenshtein_cache()
     db_path = args.db if args.db else default_db_path(args.root)
     init_db(db_path)
 
-    # Keep DB fresh before querying.
-    run_index(args.root, db_path, workers=args.workers)
+    # Keep DB fresh before querying, unless nothing on disk moved.
+    if not args.no_refresh and needs_refresh(args.root, db_path):
+        run_index(args.root, db_path, workers=args.workers)
 
     configure_libclang_from_env()
-    try:
-        clang_index = cindex.Index.create()
-    except Exception as exc:
-        print(f"Failed to initialize libclang: {exc}", file=sys.stderr)
-        return 1
+    warmup_levenshtein()
+    # Queries are tokenized in Python, libclang is only needed in clang mode.
+    clang_index = None
+    if use_clang_normaliser():
+        try:
+            clang_index = cindex.Index.create()
+        except Exception as exc:
+            print(f"Failed to initialize libclang: {exc}", file=sys.stderr)
+            return 1
 
     try:
         query = parse_query(args.query, clang_index)
@@ -107,13 +97,13 @@ def _cmd_search(args: argparse.Namespace) -> int:
         print(f"Query parsing failed: {exc}", file=sys.stderr)
         return 1
 
+    # Rows come back ranked: distance, then name/path/position (see fetch_candidates).
     db = open_db(db_path)
     try:
-        candidates = fetch_candidates(db, query, limit=max(200, args.top * 20))
+        ranked = fetch_candidates(db, query, limit=max(0, args.top))
     finally:
         db.close()
 
-    ranked = rank_candidates(candidates, query, args.top)
     for row in ranked:
         params_text = _format_params(row["params"])
         print(
@@ -156,6 +146,11 @@ def build_parser() -> argparse.ArgumentParser:
     search_parser.add_argument("--db", default=None, help="Path to sqlite database file")
     search_parser.add_argument("--top", type=int, default=20, help="How many results to print")
     search_parser.add_argument("--workers", type=int, default=default_workers, help="Workers used for refresh indexing")
+    search_parser.add_argument(
+        "--no-refresh",
+        action="store_true",
+        help="Query the existing index without checking the project for changes",
+    )
     search_parser.set_defaults(handler=_cmd_search)
 
     tui_parser = subparsers.add_parser("tui", help="Run interactive Textual UI")
@@ -1,15 +1,40 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import functools
+import heapq
 import os
 import re
 import subprocess
+import threading
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from clang import cindex
 
+# Optional accelerator, loaded on the first distance so parser processes (which
+# never score) skip the import. None = not loaded yet, False = not installed.
+_rf_levenshtein = None
+
+
+def _load_rapidfuzz():
+    global _rf_levenshtein
+    if _rf_levenshtein is None:
+        try:
+            from rapidfuzz.distance import Levenshtein
+        except ImportError:  # The pure-Python DP is used instead.
+            _rf_levenshtein = False
+        else:
+            _rf_levenshtein = Levenshtein
+    return _rf_levenshtein or None
+
+
+_RE_F = re.compile(r"\b__f__\b")
+_RE_Q = re.compile(r"\b__q__\b")
+_RE_WS = re.compile(r"\s+")
+_RE_WORD_PAREN = re.compile(r"\w+\s*\(")
+
 
 def _clang_language_arg(language: str) -> str:
     lang = str(language).strip().lower()
@@ -18,14 +43,14 @@ def _clang_language_arg(language: str) -> str:
     return "-xc"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Location:
     file_name: str
     line: int
     column: int
 
 
-@dataclass
+@dataclass(slots=True)
 class Function:
     name: str
     location: Location
@@ -34,18 +59,23 @@ class Function:
     is_variadic: bool = False
     signature_norm: Optional[str] = None
 
-    def normalised_signature(self, index: cindex.Index, language: str = "c") -> str:
+    def prototype(self, marker: str = "__f__") -> str:
         param_types = [param_type for (param_type, _) in self.parameters]
         if self.is_variadic:
             param_types.append("...")
-        proto = f"{self.return_type} __f__({', '.join(param_types)});"
-        if str(language).strip().lower() in {"c++", "cpp", "cxx", "cc"}:
+        return f"{self.return_type} {marker}({', '.join(param_types)});"
+
+    def normalised_signature(self, index: cindex.Index, language: str = "c") -> str:
+        proto = self.prototype()
+        if not use_clang_normaliser():
+            sig = tokenize_declaration(proto)
+        elif str(language).strip().lower() in {"c++", "cpp", "cxx", "cc"}:
             sig = normalise_signature_with_language(index, proto, language=language)
         else:
             sig = normalise_signature(index, proto)
-        sig = re.sub(r"\b__f__\b", "", sig)
+        sig = _RE_F.sub("", sig)
         sig = sig.replace(" ;", "").strip()
-        sig = re.sub(r"\s+", " ", sig).strip()
+        sig = _RE_WS.sub(" ", sig).strip()
         return sig
 
 
@@ -106,6 +136,69 @@ def clang_c_include_path_args() -> List[str]:
     return include_args
 
 
+# Comments, then C/C++ tokens: literals, pp-numbers, identifiers, multi-char
+# punctuators (longest first) and any other single character.
+_RE_DECL_COMMENT = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+_RE_DECL_TOKEN = re.compile(
+    r"""
+    "(?:\\.|[^"\\])*" | '(?:\\.|[^'\\])*'
+    | \.?\d(?:[eEpP][+-]|[\w.])*
+    | [A-Za-z_$][\w$]*
+    | \.\.\. | ->\* | <<= | >>= | :: | -> | \+\+ | -- | && | \|\| | << | >> | \#\# | \.\*
+    | [-+*/%&|^!=<>]=
+    | \S
+    """,
+    re.X,
+)
+
+# Spellings that name the same type, and specifiers that do not change it.
+_TYPE_WORD_PAIRS = {("signed", "int"): "int", ("unsigned", "int"): "unsigned"}
+_DROPPED_DECL_WORDS = {"static", "extern", "inline", "register", "_Thread_local", "thread_local"}
+
+
+def use_clang_normaliser() -> bool:
+    """
+    `CSIG_CLANG_NORMALISE=1` tokenizes signatures with libclang instead of `tokenize_declaration`.
+    """
+    return os.environ.get("CSIG_CLANG_NORMALISE", "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+# Bump when either normaliser's output changes: rows indexed by another version
+# hold signature_norm values that fresh queries no longer match.
+_NORMALISER_VERSION = 2
+
+
+def normaliser_version() -> str:
+    """
+    Identifies the active normaliser; `run_index` re-parses everything when it changes.
+    """
+    kind = "clang" if use_clang_normaliser() else "regex"
+    return f"{kind}-{_NORMALISER_VERSION}"
+
+
+def _canonical_type_words(tokens: List[str]) -> List[str]:
+    result: List[str] = []
+    for token in tokens:
+        if token in _DROPPED_DECL_WORDS:
+            continue
+        if result and (result[-1], token) in _TYPE_WORD_PAIRS:
+            result[-1] = _TYPE_WORD_PAIRS[(result[-1], token)]
+            continue
+        result.append(token)
+    return result
+
+
+def tokenize_declaration(text: str) -> str:
+    """
+    Normalize C declaration text with a regex tokenizer, no libclang involved.
+
+    Produces the same space-separated token stream as the clang tokenizer for
+    declarations, minus comments.
+    """
+    tokens = _RE_DECL_TOKEN.findall(_RE_DECL_COMMENT.sub(" ", text))
+    return " ".join(_canonical_type_words(tokens))
+
+
 def normalise_signature(index: cindex.Index, query_string: str) -> str:
     return normalise_signature_with_language(index, query_string, language="c")
 
@@ -126,14 +219,45 @@ def normalise_signature_with_language(index: cindex.Index, query_string: str, la
     )
 
     tokens = [tok.spelling for tok in tu.get_tokens(extent=tu.cursor.extent)]
-    return " ".join(tokens).strip()
+    return " ".join(_canonical_type_words(tokens)).strip()
+
 
+def normalise_signatures_batched(
+    index: cindex.Index,
+    functions: List[Function],
+    language: str = "c",
+) -> Optional[List[str]]:
+    """
+    Clang-normalise every function of a file in one libclang pass: the
+    prototypes go into one buffer under `__f{i}__` markers and the token stream
+    is split back on `;`. Returns None when the split does not line up, callers
+    then fall back to `Function.normalised_signature` one by one.
+    """
+    source = "\n".join(function.prototype(f"__f{i}__") for i, function in enumerate(functions))
+    try:
+        norm = normalise_signature_with_language(index, source, language=language)
+    except Exception:
+        return None
 
-def parse_query(query_str: str, index: cindex.Index) -> Query:
+    parts = norm.split(";")
+    if len(parts) != len(functions) + 1 or parts[-1].strip():
+        return None
+    signatures: List[str] = []
+    for i, part in enumerate(parts[:-1]):
+        marker = f"__f{i}__"
+        if part.count(marker) != 1:
+            return None
+        signatures.append(_RE_WS.sub(" ", part.replace(marker, "")).strip())
+    return signatures
+
+
+def parse_query(query_str: str, index: Optional[cindex.Index] = None) -> Query:
     """
     Supported forms:
     - "<signature>"
     - "<name> :: <signature>"
+
+    `index` is only used with the clang normaliser, one is created on demand if omitted.
     """
     if "::" in query_str:
         name_part, sig_part = query_str.split("::", 1)
@@ -147,13 +271,19 @@ def parse_query(query_str: str, index: cindex.Index) -> Query:
         return Query(name=name, normalised_signature=None)
 
     fake = _build_fake_declaration(sig_part)
-    try:
-        norm = normalise_signature(index, fake)
-    except Exception:
-        norm = normalise_signature_with_language(index, fake, language="c++")
-    norm = re.sub(r"\b__q__\b", "", norm)
+    if not use_clang_normaliser():
+        norm = tokenize_declaration(fake)
+    else:
+        if index is None:
+            configure_libclang_from_env()
+            index = cindex.Index.create()
+        try:
+            norm = normalise_signature(index, fake)
+        except Exception:
+            norm = normalise_signature_with_language(index, fake, language="c++")
+    norm = _RE_Q.sub("", norm)
     norm = norm.replace(" ;", "").strip()
-    norm = re.sub(r"\s+", " ", norm).strip()
+    norm = _RE_WS.sub(" ", norm).strip()
     return Query(name=name, normalised_signature=norm or None)
 
 
@@ -166,14 +296,14 @@ def _build_fake_declaration(sig_part: str) -> str:
 
     # Heuristic for "ret (args)" format (no function name in source string).
     # Keep existing named prototypes untouched, for example "int foo(int)".
-    if re.search(r"\w+\s*\(", sig_part) and " (" not in sig_part:
+    if _RE_WORD_PAREN.search(sig_part) and " (" not in sig_part:
         return sig_part if sig_part.rstrip().endswith(";") else f"{sig_part};"
 
-    open_paren = re.search(r"\(", sig_part)
-    if open_paren is None:
+    open_paren = sig_part.find("(")
+    if open_paren < 0:
         return sig_part if sig_part.rstrip().endswith(";") else f"{sig_part};"
-    ret = sig_part[: open_paren.start()].strip()
-    params = sig_part[open_paren.start() :].strip()
+    ret = sig_part[:open_paren].strip()
+    params = sig_part[open_paren:].strip()
     return f"{ret} __q__ {params};"
 
 
@@ -188,20 +318,27 @@ def iter_functions(
     if only_from_file is not None:
         only_path = str(Path(only_from_file).resolve())
 
-    def collect(node: cindex.Cursor) -> None:
+    # Cursors from one file share its spelling, so resolve each spelling once.
+    file_matches: Dict[str, bool] = {}
+
+    for node in tu.cursor.walk_preorder():
         if node.kind != cindex.CursorKind.FUNCTION_DECL or not node.location.file:
-            return
+            continue
 
         loc = node.location
         loc_file = str(loc.file)
 
-        if only_path is not None:
-            try:
-                if str(Path(loc_file).resolve()) != only_path:
-                    return
-            except Exception:
-                if loc_file != only_from_file:
-                    return
+        # libclang reports the main file with the spelling it was parsed under.
+        if only_path is not None and loc_file != only_from_file and loc_file != only_path:
+            matches = file_matches.get(loc_file)
+            if matches is None:
+                try:
+                    matches = str(Path(loc_file).resolve()) == only_path
+                except Exception:
+                    matches = loc_file == only_from_file
+                file_matches[loc_file] = matches
+            if not matches:
+                continue
 
         params: List[Tuple[str, Optional[str]]] = []
         for child in node.get_children():
@@ -224,42 +361,310 @@ def iter_functions(
             )
         )
 
-    def visit(node: cindex.Cursor) -> None:
-        collect(node)
-        for child in node.get_children():
-            visit(child)
-
-    visit(tu.cursor)
     return funcs
 
 
-def levenshtein_distance(a: str, b: str) -> int:
-    a_bytes = a.lower().encode("utf-8", errors="ignore")
-    b_bytes = b.lower().encode("utf-8", errors="ignore")
+def levenshtein_distance(a: str, b: str, max_dist: Optional[int] = None) -> int:
+    return levenshtein_distance_lower(a.lower(), b.lower(), max_dist)
+
+
+def levenshtein_distance_lower(a: str, b: str, max_dist: Optional[int] = None) -> int:
+    """
+    Same as `levenshtein_distance`, but expects already lower-cased input.
+
+    With `max_dist` set, any distance above it is reported as `max_dist + 1`,
+    which lets the kernels stop early on hopeless pairs.
+    """
+    # The distance is symmetric, canonical argument order doubles cache hits.
+    if b < a:
+        a, b = b, a
+    return _levenshtein_cached(a, b, max_dist)
+
+
+def clear_levenshtein_cache() -> None:
+    _levenshtein_cached.cache_clear()
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def _levenshtein_cached(a: str, b: str, max_dist: Optional[int]) -> int:
+    rf_levenshtein = _load_rapidfuzz()
+    if rf_levenshtein is not None:
+        return int(rf_levenshtein.distance(a, b, score_cutoff=max_dist))
+
+    a_bytes = a.encode("utf-8", errors="ignore")
+    b_bytes = b.encode("utf-8", errors="ignore")
     n, m = len(a_bytes), len(b_bytes)
 
+    # |n - m| <= lev(a, b) <= max(n, m)
+    if max_dist is None or max_dist > max(n, m):
+        max_dist = max(n, m)
+    if abs(n - m) > max_dist:
+        return max_dist + 1
+
     if n == 0:
         return m
     if m == 0:
         return n
+    # Use the shorter string as the bit-vector pattern.
+    if n > m:
+        a_bytes, b_bytes, n, m = b_bytes, a_bytes, m, n
+    if n <= _SMALL_PATTERN_LEN and m <= _MYERS_MAX_LEN:
+        return _levenshtein_small(a_bytes, b_bytes, max_dist)
+    if m <= _MYERS_MAX_LEN:
+        return _levenshtein_myers(a_bytes, b_bytes, max_dist)
+    return _levenshtein_dp(a_bytes, b_bytes, max_dist)
 
-    prev = list(range(m + 1))
-    cur = [0] * (m + 1)
+
+# One machine word worth of pattern bits, enough for almost every identifier.
+_MYERS_MAX_LEN = 64
+
+
+def _levenshtein_myers(a: bytes, b: bytes, max_dist: int) -> int:
+    """
+    Myers/Hyyro bit-parallel edit distance, one bit-vector column per byte of `b`.
+    """
+    n = len(a)
+    peq = [0] * 256
+    for i, ch in enumerate(a):
+        peq[ch] |= 1 << i
+
+    mask = (1 << n) - 1
+    last = 1 << (n - 1)
+    vp = mask
+    vn = 0
+    score = n
+    remaining = len(b)
+    for ch in b:
+        eq = peq[ch]
+        xv = eq | vn
+        xh = ((((eq & vp) + vp) & mask) ^ vp) | eq
+        hp = (vn | ~(xh | vp)) & mask
+        hn = vp & xh
+        if hp & last:
+            score += 1
+        elif hn & last:
+            score -= 1
+        remaining -= 1
+        # Each remaining column lowers the score by at most one.
+        if score - remaining > max_dist:
+            return max_dist + 1
+        hp = ((hp << 1) | 1) & mask
+        hn = (hn << 1) & mask
+        vp = (hn | ~(xv | hp)) & mask
+        vn = hp & xv
+    return score if score <= max_dist else max_dist + 1
+
+
+# strlen, memcpy, ctx... Short identifiers get a dict Peq instead of a 256-slot table.
+_SMALL_PATTERN_LEN = 8
+
+
+def _levenshtein_small(a: bytes, b: bytes, max_dist: int) -> int:
+    """
+    `_levenshtein_myers` specialised for patterns of at most 8 bytes.
+    """
+    peq: Dict[int, int] = {}
+    bit = 1
+    for ch in a:
+        peq[ch] = peq.get(ch, 0) | bit
+        bit <<= 1
+    mask = bit - 1
+    last = bit >> 1
+    get_eq = peq.get
+
+    vp = mask
+    vn = 0
+    score = len(a)
+    remaining = len(b)
+    for ch in b:
+        eq = get_eq(ch, 0)
+        xv = eq | vn
+        xh = ((((eq & vp) + vp) & mask) ^ vp) | eq
+        hp = (vn | ~(xh | vp)) & mask
+        hn = vp & xh
+        if hp & last:
+            score += 1
+        elif hn & last:
+            score -= 1
+        remaining -= 1
+        if score - remaining > max_dist:
+            return max_dist + 1
+        hp = ((hp << 1) | 1) & mask
+        hn = (hn << 1) & mask
+        vp = (hn | ~(xv | hp)) & mask
+        vn = hp & xv
+    return score if score <= max_dist else max_dist + 1
+
+
+def _levenshtein_dp(a_bytes: bytes, b_bytes: bytes, max_dist: int) -> int:
+    kernel = _load_native_dp()
+    if kernel is not None:
+        a_arr = _dp_np.frombuffer(a_bytes, dtype=_dp_np.uint8)
+        b_arr = _dp_np.frombuffer(b_bytes, dtype=_dp_np.uint8)
+        prev, cur = _native_dp_rows(len(b_bytes) + 1)
+        return int(kernel(a_arr, b_arr, prev, cur, max_dist))
+
+    n, m = len(a_bytes), len(b_bytes)
+    prev, cur = _python_dp_rows(m + 1)
+    prev[: m + 1] = range(m + 1)
 
     for i in range(1, n + 1):
         cur[0] = i
         ai = a_bytes[i - 1]
+        # Neighbour cells live in locals, the three-way min is inlined.
+        left = i
+        diag = i - 1
         for j in range(1, m + 1):
-            cost = 0 if ai == b_bytes[j - 1] else 1
-            cur[j] = min(
-                cur[j - 1] + 1,
-                prev[j] + 1,
-                prev[j - 1] + cost,
-            )
+            up = prev[j]
+            best = diag if ai == b_bytes[j - 1] else diag + 1
+            if up + 1 < best:
+                best = up + 1
+            if left + 1 < best:
+                best = left + 1
+            cur[j] = best
+            left = best
+            diag = up
+        # Row minimums never decrease, so the answer is already out of range.
+        if min(cur[: m + 1]) > max_dist:
+            return max_dist + 1
         prev, cur = cur, prev
+    return prev[m] if prev[m] <= max_dist else max_dist + 1
+
+
+def _python_dp_rows(size: int) -> Tuple[List[int], List[int]]:
+    # Per-thread scratch rows for the pure-Python DP, grown on demand.
+    rows = getattr(_dp_rows, "py_rows", None)
+    if rows is None or len(rows[0]) < size:
+        rows = ([0] * size, [0] * size)
+        _dp_rows.py_rows = rows
+    return rows
+
+
+def _levenshtein_dp_kernel(a, b, prev, cur, max_dist):
+    n = a.shape[0]
+    m = b.shape[0]
+    for j in range(m + 1):
+        prev[j] = j
+    for i in range(1, n + 1):
+        cur[0] = i
+        row_min = i
+        ai = a[i - 1]
+        for j in range(1, m + 1):
+            best = cur[j - 1] + 1
+            up = prev[j] + 1
+            if up < best:
+                best = up
+            diag = prev[j - 1] + (0 if ai == b[j - 1] else 1)
+            if diag < best:
+                best = diag
+            cur[j] = best
+            if best < row_min:
+                row_min = best
+        if row_min > max_dist:
+            return max_dist + 1
+        prev, cur = cur, prev
+    if prev[m] > max_dist:
+        return max_dist + 1
     return prev[m]
 
 
+# None = not loaded yet, False = numba is not installed.
+_native_dp_kernel = None
+_dp_np = None
+_dp_rows = threading.local()
+
+
+def _load_native_dp():
+    global _native_dp_kernel, _dp_np
+    if _native_dp_kernel is None:
+        try:
+            import numpy
+            from numba import njit
+        except ImportError:
+            _native_dp_kernel = False
+        else:
+            _dp_np = numpy
+            _native_dp_kernel = njit(cache=True, nogil=True)(_levenshtein_dp_kernel)
+    return _native_dp_kernel or None
+
+
+def _native_dp_rows(size: int):
+    # Per-thread scratch rows, grown on demand and reused between calls.
+    rows = getattr(_dp_rows, "rows", None)
+    if rows is None or rows[0].shape[0] < size:
+        rows = (_dp_np.empty(size, dtype=_dp_np.int32), _dp_np.empty(size, dtype=_dp_np.int32))
+        _dp_rows.rows = rows
+    return rows
+
+
+def warmup_levenshtein() -> None:
+    """
+    Compile the numba DP kernel ahead of the first query when it will be used.
+    """
+    if _load_rapidfuzz() is not None:
+        return
+    if _load_native_dp() is not None:
+        _levenshtein_dp(b"warmup", b"warm-up", 7)
+
+
+def _name_lc(row: Dict[str, Any]) -> str:
+    # fetch_candidates rows carry the lower-cased columns stored at index time.
+    value = row.get("name_lc")
+    return value if value is not None else str(row["name"]).lower()
+
+
+def _signature_lc(row: Dict[str, Any]) -> str:
+    value = row.get("signature_norm_lc")
+    return value if value is not None else str(row["signature_norm"]).lower()
+
+
+def _path_lc(row: Dict[str, Any]) -> str:
+    value = row.get("path_lc")
+    return value if value is not None else str(row["path"]).lower()
+
+
+def rank_candidates(candidates: List[Dict[str, Any]], query: Query, top: int) -> List[Dict[str, Any]]:
+    """
+    Best `top` rows by the key `fetch_candidates` orders by in SQL. Search uses
+    that SQL order as is; this ranks rows that did not come from it.
+    """
+    top = max(0, int(top))
+    query_name = query.name.lower() if query.name else None
+    query_sig = query.normalised_signature.lower() if query.normalised_signature else None
+
+    if not candidates or top == 0:
+        return []
+
+    # Max-heap (negated) of the best `top` scores seen so far; anything worse
+    # than its root can never make it into the result.
+    best_scores: List[int] = []
+    # (score, name_lc, path_lc, line, column, position, row): plain tuple
+    # comparison does the tie-break, `position` keeps rows out of it.
+    scored: List[tuple] = []
+    for position, row in enumerate(candidates):
+        threshold = -best_scores[0] if len(best_scores) >= top else None
+        name_lc = _name_lc(row)
+        score = 0
+        if query_name:
+            score += levenshtein_distance_lower(name_lc, query_name, threshold)
+            if threshold is not None and score > threshold:
+                continue
+        if query_sig:
+            remaining = threshold - score if threshold is not None else None
+            score += levenshtein_distance_lower(_signature_lc(row), query_sig, remaining)
+            if threshold is not None and score > threshold:
+                continue
+        scored.append(
+            (score, name_lc, _path_lc(row), int(row["line"]), int(row["column"]), position, row)
+        )
+        if len(best_scores) < top:
+            heapq.heappush(best_scores, -score)
+        elif score < threshold:
+            heapq.heapreplace(best_scores, -score)
+
+    return [item[-1] for item in heapq.nsmallest(top, scored)]
+
+
 def score_function(func: Function, query: Query, index: cindex.Index) -> int:
     score = 0
     if query.name is not None:
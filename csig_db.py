@@ -1,25 +1,144 @@
 from __future__ import annotations
 
 import json
+import re
 import sqlite3
 import time
+from array import array
+from itertools import repeat
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
-from csig_core import Function, Query
+from csig_core import Function, Query, levenshtein_distance_lower
 
 
-def open_db(db_path: str | Path) -> sqlite3.Connection:
-    db = sqlite3.connect(str(db_path))
+# params are stored as `type\x1ename` pairs joined by \x1f (ASCII unit/record separators).
+_PARAM_SEP = b"\x1f"
+_PARAM_NAME_SEP = b"\x1e"
+
+
+def _encode_params(params: List[Tuple[str, Optional[str]]]) -> bytes:
+    return _PARAM_SEP.join(
+        str(param_type).encode() + _PARAM_NAME_SEP + (param_name or "").encode()
+        for (param_type, param_name) in params
+    )
+
+
+def _decode_params(raw: object) -> List[Tuple[str, Optional[str]]]:
+    if not raw:
+        return []
+    if isinstance(raw, str):
+        # Rows written before the blob format stored JSON text.
+        return [(str(item[0]), item[1] if len(item) > 1 else None) for item in json.loads(raw)]
+    params: List[Tuple[str, Optional[str]]] = []
+    for chunk in bytes(raw).split(_PARAM_SEP):
+        param_type, _sep, param_name = chunk.partition(_PARAM_NAME_SEP)
+        params.append((param_type.decode(), param_name.decode() or None))
+    return params
+
+
+def _sql_levenshtein_lower(a: object, b: object) -> int:
+    if a is None or b is None:
+        return 0
+    return levenshtein_distance_lower(str(a), str(b))
+
+
+def _sql_lower(value: object) -> Optional[str]:
+    return None if value is None else str(value).lower()
+
+
+def open_db(db_path: str | Path, check_same_thread: bool = True) -> sqlite3.Connection:
+    db = sqlite3.connect(str(db_path), check_same_thread=check_same_thread)
     db.row_factory = sqlite3.Row
+    db.create_function("lev_lc", 2, _sql_levenshtein_lower, deterministic=True)
+    # Per-connection tuning: WAL-safe NORMAL sync, ~6 MB WAL cap after checkpoints,
+    # RAM temp tables, 64 MiB page cache, 256 MiB mmap.
+    db.execute("PRAGMA synchronous=NORMAL;")
+    db.execute("PRAGMA journal_size_limit=6144000;")
+    db.execute("PRAGMA temp_store=MEMORY;")
+    db.execute("PRAGMA cache_size=-65536;")
+    db.execute("PRAGMA mmap_size=268435456;")
     return db
 
 
+_SEARCH_INDEXES = {
+    "idx_functions_name": "functions(name)",
+    "idx_functions_sig": "functions(signature_norm)",
+}
+
+
+# Keep functions_fts in sync with functions; dropped for bulk loads like the indexes above.
+_FTS_TRIGGERS = {
+    "functions_fts_ai": """
+        AFTER INSERT ON functions BEGIN
+            INSERT INTO functions_fts(rowid, name, signature_norm)
+            VALUES (new.id, new.name, new.signature_norm);
+        END
+    """,
+    "functions_fts_ad": """
+        AFTER DELETE ON functions BEGIN
+            INSERT INTO functions_fts(functions_fts, rowid, name, signature_norm)
+            VALUES ('delete', old.id, old.name, old.signature_norm);
+        END
+    """,
+    "functions_fts_au": """
+        AFTER UPDATE ON functions BEGIN
+            INSERT INTO functions_fts(functions_fts, rowid, name, signature_norm)
+            VALUES ('delete', old.id, old.name, old.signature_norm);
+            INSERT INTO functions_fts(rowid, name, signature_norm)
+            VALUES (new.id, new.name, new.signature_norm);
+        END
+    """,
+}
+
+
+def _create_fts_triggers(db: sqlite3.Connection) -> None:
+    for name, body in _FTS_TRIGGERS.items():
+        db.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body};")
+
+
+def _fts_triggers_dropped(db: sqlite3.Connection) -> bool:
+    rows = db.execute(
+        "SELECT name FROM sqlite_master WHERE name = 'functions_fts' OR type = 'trigger'"
+    ).fetchall()
+    names = {str(row["name"]) for row in rows}
+    return "functions_fts" in names and not set(_FTS_TRIGGERS) <= names
+
+
+def create_search_indexes(db: sqlite3.Connection) -> None:
+    for name, target in _SEARCH_INDEXES.items():
+        db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target};")
+    if _fts_triggers_dropped(db):
+        # One pass over the bulk-loaded rows instead of a trigger call per row.
+        db.execute("INSERT INTO functions_fts(functions_fts) VALUES ('rebuild');")
+        _create_fts_triggers(db)
+
+
+def drop_search_indexes(db: sqlite3.Connection) -> None:
+    """
+    Drop lookup-only indexes and the FTS triggers before a bulk load,
+    `create_search_indexes` rebuilds both.
+    """
+    for name in _SEARCH_INDEXES:
+        db.execute(f"DROP INDEX IF EXISTS {name};")
+    for name in _FTS_TRIGGERS:
+        db.execute(f"DROP TRIGGER IF EXISTS {name};")
+
+
+def bulk_begin(db: sqlite3.Connection) -> None:
+    db.execute("BEGIN IMMEDIATE")
+
+
+def bulk_commit(db: sqlite3.Connection) -> None:
+    db.commit()
+
+
 def init_db(db_path: str | Path) -> None:
     db = open_db(db_path)
     try:
+        # page_size only sticks on an empty database and must precede WAL mode.
+        db.execute("PRAGMA page_size=8192;")
         db.execute("PRAGMA journal_mode=WAL;")
-        db.execute("PRAGMA synchronous=NORMAL;")
         db.execute(
             """
             CREATE TABLE IF NOT EXISTS files (
@@ -28,7 +147,8 @@ def init_db(db_path: str | Path) -> None:
                 mtime REAL NOT NULL,
                 size INTEGER NOT NULL,
                 parsed_at REAL,
-                last_error TEXT
+                last_error TEXT,
+                path_lc TEXT NOT NULL DEFAULT ''
             );
             """
         )
@@ -39,22 +159,78 @@ def init_db(db_path: str | Path) -> None:
                 file_id INTEGER NOT NULL,
                 name TEXT NOT NULL,
                 return_type TEXT NOT NULL,
-                params_json TEXT NOT NULL,
+                params_json BLOB NOT NULL,
                 signature_norm TEXT NOT NULL,
                 line INTEGER NOT NULL,
                 column INTEGER NOT NULL,
+                name_lc TEXT NOT NULL DEFAULT '',
+                signature_norm_lc TEXT NOT NULL DEFAULT '',
                 FOREIGN KEY(file_id) REFERENCES files(id) ON DELETE CASCADE
             );
             """
         )
-        db.execute("CREATE INDEX IF NOT EXISTS idx_functions_name ON functions(name);")
-        db.execute("CREATE INDEX IF NOT EXISTS idx_functions_sig ON functions(signature_norm);")
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            """
+        )
+        _migrate_lowercase_columns(db)
+        create_search_indexes(db)
         db.execute("CREATE INDEX IF NOT EXISTS idx_functions_file_id ON functions(file_id);")
+        _init_fts(db)
         db.commit()
     finally:
         db.close()
 
 
+def _migrate_lowercase_columns(db: sqlite3.Connection) -> None:
+    # SQLite's lower() folds ASCII only; back-fill with str.lower like freshly indexed rows.
+    db.create_function("py_lower", 1, _sql_lower, deterministic=True)
+    columns = {str(row["name"]) for row in db.execute("PRAGMA table_info(functions)").fetchall()}
+    if "name_lc" not in columns:
+        db.execute("ALTER TABLE functions ADD COLUMN name_lc TEXT NOT NULL DEFAULT '';")
+        db.execute("UPDATE functions SET name_lc = py_lower(name);")
+    if "signature_norm_lc" not in columns:
+        db.execute("ALTER TABLE functions ADD COLUMN signature_norm_lc TEXT NOT NULL DEFAULT '';")
+        db.execute("UPDATE functions SET signature_norm_lc = py_lower(signature_norm);")
+    file_columns = {str(row["name"]) for row in db.execute("PRAGMA table_info(files)").fetchall()}
+    if "path_lc" not in file_columns:
+        db.execute("ALTER TABLE files ADD COLUMN path_lc TEXT NOT NULL DEFAULT '';")
+        db.execute("UPDATE files SET path_lc = py_lower(path);")
+
+
+def _init_fts(db: sqlite3.Connection) -> None:
+    """
+    Full-text index over name/signature, kept in sync with `functions` by triggers.
+    Skipped silently when SQLite is built without FTS5; search then uses LIKE.
+    """
+    existed = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'functions_fts'"
+    ).fetchone()
+    try:
+        db.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS functions_fts USING fts5(
+                name,
+                signature_norm,
+                content='functions',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            );
+            """
+        )
+    except sqlite3.OperationalError:
+        return
+
+    if existed is None:
+        # Index rows written before the FTS table existed.
+        db.execute("INSERT INTO functions_fts(functions_fts) VALUES ('rebuild');")
+    _create_fts_triggers(db)
+
+
 def get_or_create_file(db: sqlite3.Connection, path: str, mtime: float, size: int) -> int:
     row = db.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
     if row is not None:
@@ -62,49 +238,67 @@ def get_or_create_file(db: sqlite3.Connection, path: str, mtime: float, size: in
         return int(row["id"])
 
     cursor = db.execute(
-        "INSERT INTO files(path, mtime, size, parsed_at, last_error) VALUES (?, ?, ?, NULL, NULL)",
-        (path, mtime, size),
+        """
+        INSERT INTO files(path, mtime, size, parsed_at, last_error, path_lc)
+        VALUES (?, ?, ?, NULL, NULL, ?)
+        """,
+        (path, mtime, size, path.lower()),
     )
     return int(cursor.lastrowid)
 
 
-def replace_functions_for_file(db: sqlite3.Connection, file_id: int, functions: List[Function]) -> None:
-    db.execute("DELETE FROM functions WHERE file_id = ?", (file_id,))
-    if not functions:
-        return
+# Column-wise functions of one file: name, return_type, params blob, signature_norm,
+# line, column. Built by parser workers, zipped into the INSERT by the writer.
+FunctionColumns = Tuple[List[str], List[str], List[bytes], List[str], "array[int]", "array[int]"]
+
 
-    payload = []
+def pack_function_columns(functions: List[Function]) -> FunctionColumns:
+    names: List[str] = []
+    return_types: List[str] = []
+    params: List[bytes] = []
+    signatures: List[str] = []
+    lines = array("i")
+    columns = array("i")
     for function in functions:
-        params_json = json.dumps(function.parameters, ensure_ascii=True)
         signature_norm = function.signature_norm
         if not signature_norm:
             param_types = [str(param_type) for (param_type, _name) in function.parameters]
             if function.is_variadic:
                 param_types.append("...")
             signature_norm = f"{function.return_type} ( {', '.join(param_types)} )"
-        payload.append(
-            (
-                file_id,
-                function.name,
-                function.return_type,
-                params_json,
-                signature_norm,
-                function.location.line,
-                function.location.column,
-            )
-        )
+        names.append(function.name)
+        return_types.append(function.return_type)
+        params.append(_encode_params(function.parameters))
+        signatures.append(signature_norm)
+        lines.append(function.location.line)
+        columns.append(function.location.column)
+    return (names, return_types, params, signatures, lines, columns)
+
 
+def replace_function_columns(db: sqlite3.Connection, file_id: int, columns: FunctionColumns) -> None:
+    db.execute("DELETE FROM functions WHERE file_id = ?", (file_id,))
+    if not columns[0]:
+        return
+
+    # Rows are zipped straight into the prepared INSERT inside the writer's batch transaction.
+    # The lower-cased columns are derived here rather than shipped from the parser processes.
+    names, signatures = columns[0], columns[3]
     db.executemany(
         """
         INSERT INTO functions(
-            file_id, name, return_type, params_json, signature_norm, line, column
+            file_id, name, return_type, params_json, signature_norm, line, column,
+            name_lc, signature_norm_lc
         )
-        VALUES (?, ?, ?, ?, ?, ?, ?)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
-        payload,
+        zip(repeat(file_id), *columns, map(str.lower, names), map(str.lower, signatures)),
     )
 
 
+def replace_functions_for_file(db: sqlite3.Connection, file_id: int, functions: List[Function]) -> None:
+    replace_function_columns(db, file_id, pack_function_columns(functions))
+
+
 def mark_file_parsed(
     db: sqlite3.Connection,
     *,
@@ -132,48 +326,92 @@ def mark_file_error(
     )
 
 
+def get_meta(db: sqlite3.Connection, key: str) -> Optional[str]:
+    row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return None if row is None else row["value"]
+
+
+def set_meta(db: sqlite3.Connection, key: str, value: object) -> None:
+    db.execute(
+        "INSERT INTO meta(key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, str(value)),
+    )
+
+
+def delete_meta(db: sqlite3.Connection, *keys: str) -> None:
+    db.executemany("DELETE FROM meta WHERE key = ?", [(key,) for key in keys])
+
+
+def get_max_file_mtime(db: sqlite3.Connection) -> Optional[float]:
+    row = db.execute("SELECT MAX(mtime) AS mtime FROM files").fetchone()
+    return None if row is None or row["mtime"] is None else float(row["mtime"])
+
+
 def iter_file_states(db: sqlite3.Connection) -> Dict[str, Tuple[float, int]]:
     rows = db.execute("SELECT path, mtime, size FROM files").fetchall()
     return {str(row["path"]): (float(row["mtime"]), int(row["size"])) for row in rows}
 
 
+# unicode61 splits on everything that is not a letter or digit, '_' included.
+_RE_FTS_TOKEN = re.compile(r"[^\W_]+")
+
+
+def _fts_match_expression(query: Query) -> str:
+    """
+    "name : "foo bar"* OR signature_norm : "int int"": prefix match on the
+    name tokens, phrase match on the signature tokens.
+    """
+    parts: List[str] = []
+    if query.name:
+        tokens = _RE_FTS_TOKEN.findall(query.name)
+        if tokens:
+            parts.append(f'name : "{" ".join(tokens)}"*')
+    if query.normalised_signature:
+        tokens = _RE_FTS_TOKEN.findall(query.normalised_signature)
+        if tokens:
+            parts.append(f'signature_norm : "{" ".join(tokens)}"')
+    return " OR ".join(parts)
+
+
 def fetch_candidates(db: sqlite3.Connection, query: Query, limit: int = 500) -> List[dict]:
+    """
+    Return up to `limit` functions closest to `query`, best first.
+
+    Candidates come from the FTS5 index plus name substring matches first, then
+    from LIKE substring matching on name or signature, then from the whole table. Distances are computed inside
+    SQLite with `lev_lc` over the lower-cased columns, so only the rows that survive the LIMIT
+    are materialised and decoded.
+    """
     where = ""
     args: List[object] = []
 
-    if query.name and query.normalised_signature:
-        where = "WHERE f.name LIKE ? OR f.signature_norm LIKE ?"
-        args.extend([f"%{query.name}%", f"%{query.normalised_signature}%"])
-    elif query.name:
-        where = "WHERE f.name LIKE ?"
-        args.append(f"%{query.name}%")
-    elif query.normalised_signature:
-        where = "WHERE f.signature_norm LIKE ?"
-        args.append(f"%{query.normalised_signature}%")
+    name_lc = query.name.lower() if query.name else None
+    sig_lc = query.normalised_signature.lower() if query.normalised_signature else None
 
-    rows = db.execute(
-        f"""
-        SELECT
-            f.id,
-            fi.path AS path,
-            f.name,
-            f.return_type,
-            f.params_json,
-            f.signature_norm,
-            f.line,
-            f.column
-        FROM functions AS f
-        JOIN files AS fi ON fi.id = f.file_id
-        {where}
-        ORDER BY f.name COLLATE NOCASE, fi.path COLLATE NOCASE, f.line, f.column
-        LIMIT ?
-        """,
-        (*args, limit),
-    ).fetchall()
+    if name_lc and sig_lc:
+        where = "WHERE f.name_lc LIKE ? OR f.signature_norm_lc LIKE ?"
+        args.extend([f"%{name_lc}%", f"%{sig_lc}%"])
+    elif name_lc:
+        where = "WHERE f.name_lc LIKE ?"
+        args.append(f"%{name_lc}%")
+    elif sig_lc:
+        where = "WHERE f.signature_norm_lc LIKE ?"
+        args.append(f"%{sig_lc}%")
 
-    if not rows and where:
-        rows = db.execute(
-            """
+    score_terms: List[str] = []
+    score_args: List[object] = []
+    if name_lc:
+        score_terms.append("lev_lc(f.name_lc, ?)")
+        score_args.append(name_lc)
+    if sig_lc:
+        score_terms.append("lev_lc(f.signature_norm_lc, ?)")
+        score_args.append(sig_lc)
+    order_by = "f.name_lc, fi.path_lc, f.line, f.column"
+    if score_terms:
+        order_by = f"{' + '.join(score_terms)}, {order_by}"
+
+    def select(where_sql: str) -> str:
+        return f"""
             SELECT
                 f.id,
                 fi.path AS path,
@@ -182,32 +420,75 @@ def fetch_candidates(db: sqlite3.Connection, query: Query, limit: int = 500) ->
                 f.params_json,
                 f.signature_norm,
                 f.line,
-                f.column
+                f.column,
+                f.name_lc,
+                f.signature_norm_lc,
+                fi.path_lc AS path_lc
             FROM functions AS f
             JOIN files AS fi ON fi.id = f.file_id
-            ORDER BY f.name COLLATE NOCASE, fi.path COLLATE NOCASE, f.line, f.column
+            {where_sql}
+            ORDER BY {order_by}
             LIMIT ?
-            """,
-            (limit,),
-        ).fetchall()
+            """
+
+    # Plain tuples: fixed column order, no sqlite3.Row wrapper per fetched row.
+    cur = db.cursor()
+    cur.row_factory = None
+
+    rows: List[tuple] = []
+    match = _fts_match_expression(query)
+    if match:
+        # FTS only prefix-matches whole tokens ("add" misses "uadd"), so name
+        # substrings join the candidate set before the LIMIT.
+        fts_where = "WHERE f.id IN (SELECT rowid FROM functions_fts WHERE functions_fts MATCH ?)"
+        fts_args: List[object] = [match]
+        if name_lc:
+            fts_where += " OR f.name_lc LIKE ?"
+            fts_args.append(f"%{name_lc}%")
+        try:
+            rows = cur.execute(select(fts_where), (*fts_args, *score_args, limit)).fetchall()
+        except sqlite3.OperationalError:
+            # No FTS5 table (or SQLite without FTS5): fall through to LIKE.
+            rows = []
+
+    if not rows and where:
+        rows = cur.execute(select(where), (*args, *score_args, limit)).fetchall()
+
+    if not rows:
+        rows = cur.execute(select(""), (*score_args, limit)).fetchall()
+    cur.close()
 
     result: List[dict] = []
-    for row in rows:
-        params_raw = row["params_json"]
+    for (
+        id_,
+        path,
+        name,
+        return_type,
+        params_raw,
+        signature_norm,
+        line,
+        column,
+        name_lc_value,
+        signature_norm_lc,
+        path_lc,
+    ) in rows:
         try:
-            params = json.loads(params_raw) if params_raw else []
+            params = _decode_params(params_raw)
         except Exception:
             params = []
         result.append(
             {
-                "id": int(row["id"]),
-                "path": str(row["path"]),
-                "name": str(row["name"]),
-                "return_type": str(row["return_type"]),
+                "id": id_,
+                "path": path,
+                "name": name,
+                "return_type": return_type,
                 "params": params,
-                "signature_norm": str(row["signature_norm"]),
-                "line": int(row["line"]),
-                "column": int(row["column"]),
+                "signature_norm": signature_norm,
+                "line": line,
+                "column": column,
+                "name_lc": name_lc_value,
+                "signature_norm_lc": signature_norm_lc,
+                "path_lc": path_lc,
             }
         )
     return result
@@ -1,24 +1,52 @@
 from __future__ import annotations
 
+import atexit
+import multiprocessing
 import os
 import queue
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
 import threading
 import time
 import traceback
+from array import array
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
 
 from clang import cindex
 
-from csig_core import Function, configure_libclang_from_env, iter_functions
+from csig_core import (
+    Function,
+    configure_libclang_from_env,
+    iter_functions,
+    normalise_signatures_batched,
+    normaliser_version,
+    use_clang_normaliser,
+)
 from csig_db import (
+    FunctionColumns,
+    bulk_begin,
+    bulk_commit,
+    create_search_indexes,
+    delete_meta,
+    drop_search_indexes,
+    get_max_file_mtime,
+    get_meta,
     get_or_create_file,
     init_db,
     iter_file_states,
     mark_file_error,
     mark_file_parsed,
     open_db,
-    replace_functions_for_file,
+    pack_function_columns,
+    replace_function_columns,
+    set_meta,
 )
 
 
@@ -27,6 +55,8 @@ ProgressCallback = Callable[[Dict[str, Any]], None]
 C_EXTENSIONS = {".c"}
 CPP_EXTENSIONS = {".cc", ".cpp", ".cxx", ".c++"}
 HEADER_EXTENSIONS = {".h", ".hh", ".hpp", ".hxx"}
+# Prefilter for the tree walk: one frozen set, built once at import.
+_SOURCE_EXTENSIONS = frozenset(C_EXTENSIONS | CPP_EXTENSIONS | HEADER_EXTENSIONS)
 
 
 def _clang_language_arg(language: str) -> str:
@@ -36,6 +66,20 @@ def _clang_language_arg(language: str) -> str:
     return "-xc"
 
 
+# C++-only keywords that make a header's C parse a wasted attempt.
+_RE_CPP_HEADER_HINT = re.compile(rb"\b(?:class|namespace|template)\b")
+_HEADER_SNIFF_BYTES = 4096
+
+
+def _header_looks_cpp(path: str) -> bool:
+    try:
+        with open(path, "rb") as handle:
+            head = handle.read(_HEADER_SNIFF_BYTES)
+    except OSError:
+        return False
+    return _RE_CPP_HEADER_HINT.search(head) is not None
+
+
 def _language_candidates_for_path(path: str) -> List[str]:
     suffix = Path(path).suffix.lower()
     if suffix in C_EXTENSIONS:
@@ -43,44 +87,84 @@ def _language_candidates_for_path(path: str) -> List[str]:
     if suffix in CPP_EXTENSIONS:
         return ["c++"]
     if suffix in HEADER_EXTENSIONS:
-        return ["c", "c++"]
+        # Headers keep both attempts, the sniffed language goes first.
+        return ["c++", "c"] if _header_looks_cpp(path) else ["c", "c++"]
     return ["c"]
 
 
+_EMIT_INTERVAL = 0.05
+
+_COUNTER_FIELDS = (
+    "files_total",
+    "files_queued",
+    "files_done",
+    "files_skipped",
+    "files_indexed",
+    "files_failed",
+    "functions_total",
+)
+_COUNTER_SLOTS = {name: slot for slot, name in enumerate(_COUNTER_FIELDS)}
+
+
 class _ProgressTracker:
     def __init__(self, progress_cb: Optional[ProgressCallback]) -> None:
         self._lock = threading.Lock()
-        self._progress: Dict[str, Any] = {
-            "files_total": 0,
-            "files_queued": 0,
-            "files_done": 0,
-            "files_skipped": 0,
-            "files_indexed": 0,
-            "files_failed": 0,
-            "functions_total": 0,
+        # Counters live in a flat int64 array; the lock only guards slot updates
+        # and the copies, snapshot dicts are built after releasing it.
+        self._counters = array("q", bytes(8 * len(_COUNTER_FIELDS)))
+        self._state: Dict[str, Any] = {
             "running": False,
             "canceled": False,
             "start_time": None,
             "end_time": None,
+            "executor_error": None,
         }
         self._progress_cb = progress_cb
+        self._last_emit = 0.0
 
     def set(self, **fields: Any) -> None:
+        # State changes (start, finish, cancel) are always reported.
         with self._lock:
-            self._progress.update(fields)
-            snapshot = dict(self._progress)
-        self._emit(snapshot)
+            for key, value in fields.items():
+                slot = _COUNTER_SLOTS.get(key)
+                if slot is None:
+                    self._state[key] = value
+                else:
+                    self._counters[slot] = int(value)
+            counters = self._counters.tolist()
+            state = dict(self._state)
+            self._last_emit = time.monotonic()
+        self._emit(self._build_snapshot(counters, state))
 
     def inc(self, **increments: int) -> None:
+        counters: Optional[List[int]] = None
+        values = self._counters
         with self._lock:
             for key, delta in increments.items():
-                self._progress[key] = int(self._progress.get(key, 0)) + int(delta)
-            snapshot = dict(self._progress)
-        self._emit(snapshot)
+                values[_COUNTER_SLOTS[key]] += delta
+            # Counter updates reach the callback at most every _EMIT_INTERVAL seconds.
+            now = time.monotonic()
+            if self._progress_cb is not None and now - self._last_emit >= _EMIT_INTERVAL:
+                self._last_emit = now
+                counters = values.tolist()
+                state = dict(self._state)
+        if counters is not None:
+            self._emit(self._build_snapshot(counters, state))
+
+    def value(self, name: str) -> int:
+        return int(self._counters[_COUNTER_SLOTS[name]])
 
     def snapshot(self) -> Dict[str, Any]:
         with self._lock:
-            return dict(self._progress)
+            counters = self._counters.tolist()
+            state = dict(self._state)
+        return self._build_snapshot(counters, state)
+
+    @staticmethod
+    def _build_snapshot(counters: List[int], state: Dict[str, Any]) -> Dict[str, Any]:
+        snapshot: Dict[str, Any] = dict(zip(_COUNTER_FIELDS, counters))
+        snapshot.update(state)
+        return snapshot
 
     def _emit(self, snapshot: Dict[str, Any]) -> None:
         if self._progress_cb is None:
@@ -92,6 +176,151 @@ class _ProgressTracker:
             return
 
 
+# (path, mtime, size)
+Task = Tuple[str, float, int]
+
+
+class _TaskDeques:
+    """
+    One task deque per worker. `put` deals tasks round-robin, a worker pops its
+    own deque from the right and steals from the left of the others when it runs dry.
+
+    deque append/pop are atomic under the GIL, so the deques take no locks of
+    their own: `_available` counts queued tasks (plus one wake-up per worker
+    after `close`) and `_slots` bounds the total like a `queue.Queue(maxsize)`.
+    """
+
+    def __init__(self, workers: int, maxsize: int) -> None:
+        self._deques: List[Deque[Task]] = [deque() for _ in range(workers)]
+        self._available = threading.Semaphore(0)
+        self._slots = threading.Semaphore(maxsize)
+        self._next = 0
+        self._closed = False
+
+    def put(self, task: Task) -> None:
+        self._slots.acquire()
+        self._deques[self._next].append(task)
+        self._next = (self._next + 1) % len(self._deques)
+        self._available.release()
+
+    def close(self) -> None:
+        """
+        No more tasks; every worker's `get` returns None once the deques are drained.
+        """
+        self._closed = True
+        for _ in self._deques:
+            self._available.release()
+
+    def get(self, worker_idx: int) -> Optional[Task]:
+        self._available.acquire()
+        own = self._deques[worker_idx]
+        count = len(self._deques)
+        while True:
+            try:
+                task = own.pop()
+            except IndexError:
+                task = None
+                start = random.randrange(count)
+                for offset in range(count):
+                    victim = self._deques[(start + offset) % count]
+                    if victim is own:
+                        continue
+                    try:
+                        task = victim.popleft()
+                        break
+                    except IndexError:
+                        continue
+            if task is not None:
+                self._slots.release()
+                return task
+            if self._closed:
+                return None
+
+    def empty(self) -> bool:
+        return not any(self._deques)
+
+
+_PCH_LOCK = threading.Lock()
+# (language, headers) -> .pch path, or None when building it failed.
+_PCH_CACHE: Dict[Tuple[str, Tuple[str, ...]], Optional[str]] = {}
+_PCH_DIR: Optional[str] = None
+
+
+def _pch_headers() -> Tuple[str, ...]:
+    """
+    `CSIG_PCH_HEADERS=stdio.h,stdlib.h` precompiles those headers once per
+    process and language; unset (the default) disables the PCH.
+    """
+    raw = os.environ.get("CSIG_PCH_HEADERS", "")
+    return tuple(item.strip() for item in raw.split(",") if item.strip())
+
+
+def _precompiled_preamble(index: cindex.Index, language: str) -> Optional[str]:
+    headers = _pch_headers()
+    if not headers:
+        return None
+    key = (language, headers)
+    with _PCH_LOCK:
+        if key in _PCH_CACHE:
+            return _PCH_CACHE[key]
+
+        global _PCH_DIR
+        pch_path: Optional[str] = None
+        try:
+            if _PCH_DIR is None:
+                _PCH_DIR = tempfile.mkdtemp(prefix="csig-pch-")
+                atexit.register(shutil.rmtree, _PCH_DIR, True)
+            tag = "cxx" if _clang_language_arg(language) == "-xc++" else "c"
+            header_path = os.path.join(_PCH_DIR, f"preamble-{tag}.h")
+            with open(header_path, "w", encoding="utf-8") as handle:
+                for header in headers:
+                    if os.path.isfile(header):
+                        handle.write(f'#include "{os.path.abspath(header)}"\n')
+                    else:
+                        handle.write(f"#include <{header}>\n")
+            tu = index.parse(path=header_path, args=[_clang_language_arg(language) + "-header"])
+            if not any(diag.severity >= diag.Error for diag in tu.diagnostics):
+                candidate = os.path.join(_PCH_DIR, f"preamble-{tag}.pch")
+                tu.save(candidate)
+                pch_path = candidate
+        except Exception:
+            pch_path = None
+        _PCH_CACHE[key] = pch_path
+        return pch_path
+
+
+def _parse_translation_unit(
+    index: cindex.Index,
+    path: str,
+    language: str,
+) -> cindex.TranslationUnit:
+    args = [_clang_language_arg(language)]
+    options = cindex.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES
+    pch_path = _precompiled_preamble(index, language)
+    if pch_path is not None:
+        try:
+            tu = index.parse(path=path, args=[*args, "-include-pch", pch_path], options=options)
+        except Exception:
+            tu = None
+        # The preamble is forced into every file; anything it breaks is reparsed plainly.
+        if tu is not None and not any(diag.severity >= diag.Error for diag in tu.diagnostics):
+            return tu
+    return index.parse(path=path, args=args, options=options)
+
+
+def _intern_function_strings(functions: List[Function]) -> None:
+    """
+    Types and signatures repeat across a tree (`int`, `const char *`, ...). Interned,
+    each distinct string is also pickled once per result from a parser process.
+    """
+    intern = sys.intern
+    for function in functions:
+        function.return_type = intern(function.return_type)
+        if function.signature_norm is not None:
+            function.signature_norm = intern(function.signature_norm)
+        function.parameters = [(intern(param_type), name) for (param_type, name) in function.parameters]
+
+
 def parse_source_file(
     path: str,
     mtime: float,
@@ -105,11 +334,7 @@ def parse_source_file(
     parse_errors: List[str] = []
     for language in _language_candidates_for_path(path):
         try:
-            tu = index.parse(
-                path=path,
-                args=[_clang_language_arg(language)],
-                options=cindex.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES,
-            )
+            tu = _parse_translation_unit(index, path, language)
         except Exception as exc:
             parse_errors.append(f"{language}: libclang parse failed: {exc}")
             continue
@@ -120,7 +345,17 @@ def parse_source_file(
             continue
 
         functions = iter_functions(tu, only_from_file=path)
-        for function in functions:
+        signatures = None
+        if len(functions) > 1 and use_clang_normaliser():
+            # One libclang pass for the whole file instead of one per function.
+            signatures = normalise_signatures_batched(index, functions, language=language)
+        if signatures is not None:
+            for function, signature in zip(functions, signatures):
+                function.signature_norm = signature
+            functions_to_normalise: List[Function] = []
+        else:
+            functions_to_normalise = functions
+        for function in functions_to_normalise:
             try:
                 function.signature_norm = function.normalised_signature(index, language=language)
             except Exception:
@@ -128,6 +363,7 @@ def parse_source_file(
                 if function.is_variadic:
                     param_types.append("...")
                 function.signature_norm = f"{function.return_type} ( {', '.join(param_types)} )"
+        _intern_function_strings(functions)
         return functions, None
 
     if parse_errors:
@@ -137,145 +373,374 @@ def parse_source_file(
 
 _DEFAULT_PARSE_SOURCE_FILE = parse_source_file
 
+# Per-process libclang state for `ProcessPoolExecutor` parsing, set by `_proc_init`.
+_PROC_INDEX: Optional[cindex.Index] = None
+_PROC_INDEX_ERROR: Optional[str] = None
+
+
+def _proc_init() -> None:
+    global _PROC_INDEX, _PROC_INDEX_ERROR
+    configure_libclang_from_env()
+    try:
+        _PROC_INDEX = cindex.Index.create()
+    except Exception as exc:
+        _PROC_INDEX_ERROR = f"Failed to initialize libclang index: {exc}"
+
+
+def _parse_in_process(path: str, mtime: float, size: int) -> Tuple[FunctionColumns, Optional[str]]:
+    # Packed here, so only flat columns (no Function objects) are pickled back.
+    if _PROC_INDEX_ERROR is not None:
+        return pack_function_columns([]), _PROC_INDEX_ERROR
+    try:
+        functions, error = parse_source_file(path, mtime, size, _PROC_INDEX)
+    except Exception:
+        return pack_function_columns([]), traceback.format_exc(limit=3)
+    return pack_function_columns(functions), error
+
+
+def create_parse_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool for libclang parsing, one `cindex.Index` per process. Processes
+    are spawned on the first submitted file, so unchanged refreshes stay cheap.
+    Long-lived callers (the TUI) can build one and pass it to every `run_index`.
+    """
+    workers = int(workers)
+    if workers <= 0:
+        workers = max(1, os.cpu_count() or 1)
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_proc_init,
+    )
+
+
+class _LazyParseExecutor:
+    """
+    Parser pool owned by one `run_index` call. Until more than `min_files` files
+    were queued, `get` returns None and the worker threads parse in-process, so a
+    refresh of a handful of files never pays for spawning interpreters.
+    """
+
+    def __init__(self, workers: int, min_files: int, tracker: _ProgressTracker) -> None:
+        self._workers = workers
+        self._min_files = min_files
+        self._tracker = tracker
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def get(self) -> Optional[Executor]:
+        if self._executor is None:
+            if self._tracker.value("files_queued") <= self._min_files:
+                return None
+            with self._lock:
+                if self._executor is None:
+                    self._executor = create_parse_executor(self._workers)
+        return self._executor
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _proc_ready() -> bool:
+    return _PROC_INDEX is not None
+
+
+def warmup_parse_executor(executor: Executor, workers: int) -> None:
+    """
+    Start the pool's processes (and libclang in each) ahead of the first run.
+    """
+    for _ in range(max(1, int(workers))):
+        executor.submit(_proc_ready)
+
+
+def _iter_source_entries(
+    root: str,
+    cancel_event: Optional[threading.Event] = None,
+) -> Iterator[Tuple[os.DirEntry, os.stat_result]]:
+    """
+    Yield (entry, stat) for C/C++ sources under `root`. Uses `os.scandir`, so
+    file type checks come from d_type and each file is stat'ed once; like
+    `os.walk`, symlinked directories are not followed and unreadable ones are skipped.
+    """
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    # Per entry, so Cancel also stops a scan of one huge flat directory.
+                    if cancel_event is not None and cancel_event.is_set():
+                        return
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                            continue
+                        _stem, dot, ext = entry.name.rpartition(".")
+                        if not dot or "." + ext.lower() not in _SOURCE_EXTENSIONS:
+                            continue
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    yield entry, stat
+        except OSError:
+            continue
+
 
 def _discover_files(
     *,
     root: Path,
-    workers: int,
     known_states: Dict[str, Tuple[float, int]],
-    task_queue: "queue.Queue[Optional[Tuple[str, float, int]]]",
+    tasks: _TaskDeques,
     cancel_event: threading.Event,
     tracker: _ProgressTracker,
 ) -> None:
     try:
-        for dirpath, _dirnames, filenames in os.walk(root):
-            if cancel_event.is_set():
-                break
-            for filename in filenames:
-                if cancel_event.is_set():
-                    break
-                suffix = Path(filename).suffix.lower()
-                if suffix not in (C_EXTENSIONS | CPP_EXTENSIONS | HEADER_EXTENSIONS):
-                    continue
-                file_path = str(Path(dirpath, filename).resolve())
-                try:
-                    stat = Path(file_path).stat()
-                except OSError:
-                    continue
-
-                mtime = float(stat.st_mtime)
-                size = int(stat.st_size)
-                tracker.inc(files_total=1)
-
-                old_state = known_states.get(file_path)
-                if old_state is not None and old_state == (mtime, size):
-                    tracker.inc(files_skipped=1, files_done=1)
-                    continue
-
-                task_queue.put((file_path, mtime, size))
-                tracker.inc(files_queued=1)
+        # `root` is already resolved, so scandir paths are absolute and normalised.
+        for entry, stat in _iter_source_entries(str(root), cancel_event):
+            file_path = entry.path
+            mtime = float(stat.st_mtime)
+            size = int(stat.st_size)
+            tracker.inc(files_total=1)
+
+            old_state = known_states.get(file_path)
+            if old_state is not None and old_state == (mtime, size):
+                tracker.inc(files_skipped=1, files_done=1)
+                continue
+
+            tasks.put((file_path, mtime, size))
+            tracker.inc(files_queued=1)
     finally:
-        for _ in range(workers):
-            task_queue.put(None)
+        tasks.close()
+
+
+# Workers hand results to the writer in batches of this many files, or sooner
+# once this many seconds passed or the task queue ran dry.
+_WORKER_BATCH_FILES = 32
+_WORKER_BATCH_SECONDS = 0.1
 
 
 def _worker_loop(
     *,
-    task_queue: "queue.Queue[Optional[Tuple[str, float, int]]]",
-    result_queue: "queue.Queue[Optional[Dict[str, Any]]]",
+    worker_idx: int,
+    tasks: _TaskDeques,
+    result_queue: "queue.Queue[Optional[List[Dict[str, Any]]]]",
     cancel_event: threading.Event,
+    executor: Optional[Executor] = None,
+    lazy_executor: Optional[_LazyParseExecutor] = None,
+    tracker: Optional[_ProgressTracker] = None,
 ) -> None:
     index: Optional[cindex.Index] = None
     index_error: Optional[str] = None
-
-    if parse_source_file is _DEFAULT_PARSE_SOURCE_FILE:
-        configure_libclang_from_env()
-        try:
-            index = cindex.Index.create()
-        except Exception as exc:
-            index_error = f"Failed to initialize libclang index: {exc}"
+    # libclang is loaded on the first file parsed in this thread, so refreshes
+    # where everything is unchanged never pay for its initialization.
+    needs_index = parse_source_file is _DEFAULT_PARSE_SOURCE_FILE
+    staged: List[Dict[str, Any]] = []
+    last_flush = time.monotonic()
 
     while True:
-        item = task_queue.get()
+        item = tasks.get(worker_idx)
         if item is None:
-            task_queue.task_done()
             break
 
         path, mtime, size = item
-        try:
-            if cancel_event.is_set():
-                continue
+        if cancel_event.is_set():
+            continue
 
-            if index_error is not None:
-                result_queue.put(
-                    {
-                        "path": path,
-                        "mtime": mtime,
-                        "size": size,
-                        "functions": [],
-                        "error": index_error,
-                    }
-                )
-                continue
+        file_executor = executor
+        if file_executor is None and lazy_executor is not None:
+            file_executor = lazy_executor.get()
+
+        if file_executor is None and needs_index:
+            needs_index = False
+            configure_libclang_from_env()
+            try:
+                index = cindex.Index.create()
+            except Exception as exc:
+                index_error = f"Failed to initialize libclang index: {exc}"
 
+        if file_executor is not None:
+            # The thread keeps one file in flight; parsing runs outside this process's GIL.
+            try:
+                columns, error = file_executor.submit(_parse_in_process, path, mtime, size).result()
+            except Exception as exc:
+                # `_parse_in_process` reports parse failures itself, so this is the pool
+                # failing (a crashed process, shutdown, cancellation). The file gets no
+                # result and stays unindexed for the next run; this run is canceled.
+                cancel_event.set()
+                if tracker is not None:
+                    tracker.set(executor_error=f"{type(exc).__name__}: {exc}")
+                continue
+        elif index_error is not None:
+            columns = pack_function_columns([])
+            error = index_error
+        else:
             try:
                 functions, error = parse_source_file(path, mtime, size, index)
             except Exception:
                 functions = []
                 error = traceback.format_exc(limit=3)
+            columns = pack_function_columns(functions)
+
+        staged.append(
+            {
+                "path": path,
+                "mtime": mtime,
+                "size": size,
+                "columns": columns,
+                "error": error,
+            }
+        )
+        if (
+            len(staged) >= _WORKER_BATCH_FILES
+            or time.monotonic() - last_flush >= _WORKER_BATCH_SECONDS
+            or tasks.empty()
+        ):
+            result_queue.put(staged)
+            staged = []
+            last_flush = time.monotonic()
+
+    if staged:
+        result_queue.put(staged)
+    result_queue.put(None)
 
-            result_queue.put(
-                {
-                    "path": path,
-                    "mtime": mtime,
-                    "size": size,
-                    "functions": functions,
-                    "error": error,
-                }
-            )
-        finally:
-            task_queue.task_done()
 
-    result_queue.put(None)
+# Writer commits after this many files or seconds, whichever comes first, and
+# before it waits for more results.
+_WRITER_COMMIT_FILES = 256
+_WRITER_COMMIT_SECONDS = 0.25
 
 
 def _writer_loop(
     *,
     db_path: Path,
     workers: int,
-    result_queue: "queue.Queue[Optional[Dict[str, Any]]]",
+    result_queue: "queue.Queue[Optional[List[Dict[str, Any]]]]",
     tracker: _ProgressTracker,
+    rebuild_indexes: bool = False,
+    cancel_event: Optional[threading.Event] = None,
 ) -> None:
     db = open_db(db_path)
+    # Fewer, larger checkpoints while the writer streams batches into the WAL.
+    db.execute("PRAGMA wal_autocheckpoint=10000;")
     finished_workers = 0
+    pending = 0
+    batch_start = 0.0
     try:
+        if rebuild_indexes:
+            bulk_begin(db)
+            drop_search_indexes(db)
+            bulk_commit(db)
+
         while finished_workers < workers:
-            item = result_queue.get()
+            try:
+                item = result_queue.get_nowait()
+            except queue.Empty:
+                # Never wait on the workers while holding the write lock: a second
+                # run_index on this database (e.g. the pre-search refresh) needs it too.
+                if db.in_transaction:
+                    bulk_commit(db)
+                    pending = 0
+                item = result_queue.get()
+
             if item is None:
                 finished_workers += 1
                 continue
 
-            path = str(item["path"])
-            mtime = float(item["mtime"])
-            size = int(item["size"])
-            functions = list(item["functions"])
-            error = item["error"]
+            # Batched transactions instead of a commit (and fsync) per file, opened
+            # lazily so the lock is only held while results are being written.
+            if not db.in_transaction:
+                bulk_begin(db)
+                batch_start = time.monotonic()
+            indexed = failed = functions_total = 0
+            for result in item:
+                path = str(result["path"])
+                mtime = float(result["mtime"])
+                size = int(result["size"])
+                columns = result["columns"]
+                error = result["error"]
+
+                file_id = get_or_create_file(db, path, mtime, size)
+
+                if error:
+                    mark_file_error(db, file_id=file_id, mtime=mtime, size=size, error=str(error))
+                    failed += 1
+                else:
+                    replace_function_columns(db, file_id, columns)
+                    mark_file_parsed(db, file_id=file_id, mtime=mtime, size=size)
+                    indexed += 1
+                    functions_total += len(columns[0])
+            tracker.inc(
+                files_indexed=indexed,
+                files_failed=failed,
+                files_done=indexed + failed,
+                functions_total=functions_total,
+            )
+
+            pending += len(item)
+            if pending >= _WRITER_COMMIT_FILES or time.monotonic() - batch_start >= _WRITER_COMMIT_SECONDS:
+                bulk_commit(db)
+                pending = 0
+
+        if rebuild_indexes:
+            if not db.in_transaction:
+                bulk_begin(db)
+            create_search_indexes(db)
+        bulk_commit(db)
+    except BaseException:
+        db.rollback()
+        # result_queue is bounded: stop the workers and drain it so none of them
+        # stays blocked on put() after the writer is gone.
+        if cancel_event is not None:
+            cancel_event.set()
+        while finished_workers < workers:
+            if result_queue.get() is None:
+                finished_workers += 1
+        raise
+    finally:
+        db.close()
+
 
-            file_id = get_or_create_file(db, path, mtime, size)
+# run_index starts its own parser pool only once more than this many files per
+# worker were queued; below that, spawning the processes costs more than it saves.
+_POOL_MIN_FILES_PER_WORKER = 2
 
-            if error:
-                mark_file_error(db, file_id=file_id, mtime=mtime, size=size, error=str(error))
-                db.commit()
-                tracker.inc(files_failed=1, files_done=1)
-                continue
 
-            replace_functions_for_file(db, file_id, functions)
-            mark_file_parsed(db, file_id=file_id, mtime=mtime, size=size)
-            db.commit()
-            tracker.inc(files_indexed=1, files_done=1, functions_total=len(functions))
+def needs_refresh(root: str, db_path: str) -> bool:
+    """
+    Cheap pre-search check: True if any source file under `root` is newer than
+    everything indexed, the number of source files changed since the last
+    completed `run_index` of this root, or the signature normaliser changed.
+    """
+    root_path = Path(root).resolve()
+    db_file = Path(db_path).resolve()
+    if not db_file.exists():
+        return True
+
+    db = open_db(db_file)
+    try:
+        try:
+            scanned_root = get_meta(db, "last_scan_root")
+            scanned_total = get_meta(db, "last_scan_files_total")
+            normaliser = get_meta(db, "signature_normaliser")
+            mtime_max = get_max_file_mtime(db)
+        except sqlite3.Error:
+            return True
     finally:
         db.close()
 
+    if scanned_root != str(root_path) or scanned_total is None or mtime_max is None:
+        return True
+    if normaliser != normaliser_version():
+        return True
+
+    files_total = 0
+    for _entry, stat in _iter_source_entries(str(root_path)):
+        if stat.st_mtime > mtime_max:
+            return True
+        files_total += 1
+    return files_total != int(scanned_total)
+
 
 def run_index(
     root: str,
@@ -283,6 +748,7 @@ def run_index(
     workers: int,
     progress_cb: Optional[ProgressCallback] = None,
     cancel_event: Optional[threading.Event] = None,
+    executor: Optional[Executor] = None,
 ) -> Dict[str, Any]:
     root_path = Path(root).resolve()
     if not root_path.exists():
@@ -300,6 +766,13 @@ def run_index(
     state_db = open_db(db_file)
     try:
         known_states = iter_file_states(state_db)
+        if get_meta(state_db, "signature_normaliser") != normaliser_version():
+            # Stored signature_norm values came from another normaliser: re-parse everything.
+            known_states = {}
+        # needs_refresh trusts these only after a completed run; they are written
+        # again at the end, so a canceled or failed run leaves them unset.
+        delete_meta(state_db, "last_scan_root", "last_scan_files_total")
+        state_db.commit()
     finally:
         state_db.close()
 
@@ -312,18 +785,26 @@ def run_index(
         canceled=False,
         start_time=time.time(),
         end_time=None,
+        executor_error=None,
     )
 
-    task_queue: "queue.Queue[Optional[Tuple[str, float, int]]]" = queue.Queue(maxsize=max(16, workers * 8))
-    result_queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+    tasks = _TaskDeques(workers, maxsize=max(16, workers * 8))
+    # Bounded so parsed batches cannot pile up in RAM while the writer is busy.
+    result_queue: "queue.Queue[Optional[List[Dict[str, Any]]]]" = queue.Queue(maxsize=max(64, workers * 16))
+    # A monkeypatched parse_source_file (tests) would not reach spawned processes.
+    lazy_executor: Optional[_LazyParseExecutor] = None
+    if parse_source_file is not _DEFAULT_PARSE_SOURCE_FILE:
+        executor = None
+    elif executor is None:
+        # Without a caller's pool (the CLI), small refreshes parse in-thread.
+        lazy_executor = _LazyParseExecutor(workers, _POOL_MIN_FILES_PER_WORKER * workers, tracker)
 
     discovery_thread = threading.Thread(
         target=_discover_files,
         kwargs={
             "root": root_path,
-            "workers": workers,
             "known_states": known_states,
-            "task_queue": task_queue,
+            "tasks": tasks,
             "cancel_event": cancel_event,
             "tracker": tracker,
         },
@@ -335,9 +816,13 @@ def run_index(
         threading.Thread(
             target=_worker_loop,
             kwargs={
-                "task_queue": task_queue,
+                "worker_idx": idx,
+                "tasks": tasks,
                 "result_queue": result_queue,
                 "cancel_event": cancel_event,
+                "executor": executor,
+                "lazy_executor": lazy_executor,
+                "tracker": tracker,
             },
             name=f"csig-worker-{idx + 1}",
             daemon=True,
@@ -352,20 +837,37 @@ def run_index(
             "workers": workers,
             "result_queue": result_queue,
             "tracker": tracker,
+            # Nothing indexed yet: cheaper to build lookup indexes once at the end.
+            "rebuild_indexes": not known_states,
+            "cancel_event": cancel_event,
         },
         name="csig-writer",
         daemon=True,
     )
 
-    writer_thread.start()
-    for thread in worker_threads:
-        thread.start()
-    discovery_thread.start()
+    try:
+        writer_thread.start()
+        for thread in worker_threads:
+            thread.start()
+        discovery_thread.start()
+
+        discovery_thread.join()
+        for thread in worker_threads:
+            thread.join()
+        writer_thread.join()
+    finally:
+        if lazy_executor is not None:
+            lazy_executor.shutdown()
 
-    discovery_thread.join()
-    for thread in worker_threads:
-        thread.join()
-    writer_thread.join()
+    if not cancel_event.is_set():
+        meta_db = open_db(db_file)
+        try:
+            set_meta(meta_db, "last_scan_root", str(root_path))
+            set_meta(meta_db, "last_scan_files_total", tracker.snapshot()["files_total"])
+            set_meta(meta_db, "signature_normaliser", normaliser_version())
+            meta_db.commit()
+        finally:
+            meta_db.close()
 
     tracker.set(
         running=False,
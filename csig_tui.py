@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import sqlite3
 import threading
 from pathlib import Path
 from typing import Any, Dict, List
@@ -8,33 +9,12 @@ from typing import Any, Dict, List
 from clang import cindex
 from textual.app import App, ComposeResult
 from textual.containers import Horizontal, Vertical
+from textual.timer import Timer
 from textual.widgets import Button, DataTable, Footer, Header, Input, Static
 
-from csig_core import configure_libclang_from_env, levenshtein_distance, parse_query
+from csig_core import configure_libclang_from_env, parse_query, use_clang_normaliser
 from csig_db import fetch_candidates, init_db, open_db
-from csig_indexer import run_index
-
-
-def _rank_candidates(candidates: List[Dict[str, Any]], query: Any, top: int) -> List[Dict[str, Any]]:
-    scored: List[tuple[int, Dict[str, Any]]] = []
-    for row in candidates:
-        score = 0
-        if query.name:
-            score += levenshtein_distance(str(row["name"]), query.name)
-        if query.normalised_signature:
-            score += levenshtein_distance(str(row["signature_norm"]), query.normalised_signature)
-        scored.append((score, row))
-
-    scored.sort(
-        key=lambda item: (
-            item[0],
-            str(item[1]["name"]).lower(),
-            str(item[1]["path"]).lower(),
-            int(item[1]["line"]),
-            int(item[1]["column"]),
-        )
-    )
-    return [row for _, row in scored[: max(0, int(top))]]
+from csig_indexer import create_parse_executor, run_index, warmup_parse_executor
 
 
 class CsigApp(App[None]):
@@ -71,9 +51,22 @@ class CsigApp(App[None]):
         self.index_workers = int(workers)
         self.cancel_event = threading.Event()
         self._index_thread: threading.Thread | None = None
-        self._search_task: asyncio.Task[None] | None = None
+        self._debounce_timer: Timer | None = None
+        # Bumped per scheduled search; results of older searches are dropped.
+        self._search_generation = 0
+        self._search_clang_index: cindex.Index | None = None
+        self._search_clang_lock = threading.Lock()
+        # One read-only connection for every search, used from worker threads.
+        self._search_db: sqlite3.Connection | None = None
+        self._search_db_lock = threading.Lock()
         self._progress_lock = threading.Lock()
         self._latest_progress: Dict[str, Any] = {}
+        # libclang parser processes live as long as the app, not one index run.
+        self._parser_pool = create_parse_executor(self.index_workers)
+        # Set by a run whose pool broke (e.g. a crashed libclang process); the
+        # next Index click starts a fresh pool.
+        self._parser_pool_failed = False
+        self._closing = False
 
     def compose(self) -> ComposeResult:
         yield Header(show_clock=True)
@@ -89,10 +82,26 @@ class CsigApp(App[None]):
 
     def on_mount(self) -> None:
         init_db(self.db_path)
+        self._search_db = open_db(self.db_path, check_same_thread=False)
+        self._search_db.execute("PRAGMA query_only = 1;")
         table = self.query_one("#results", DataTable)
         table.add_columns("Location", "Name", "Signature")
         table.cursor_type = "row"
         self.set_interval(0.3, self._refresh_progress)
+        warmup_parse_executor(self._parser_pool, self.index_workers)
+
+    async def on_unmount(self) -> None:
+        self._closing = True
+        self.cancel_event.set()
+        # The run must be over before its pool goes away, or futures it still
+        # submits fail with CancelledError / RuntimeError.
+        if self._index_thread is not None:
+            await asyncio.to_thread(self._index_thread.join)
+        self._parser_pool.shutdown(wait=False, cancel_futures=True)
+        with self._search_db_lock:
+            if self._search_db is not None:
+                self._search_db.close()
+                self._search_db = None
 
     def _on_index_progress(self, snapshot: Dict[str, Any]) -> None:
         with self._progress_lock:
@@ -131,6 +140,12 @@ class CsigApp(App[None]):
             return
 
         self.cancel_event.clear()
+        if self._parser_pool_failed:
+            self._parser_pool_failed = False
+            self._parser_pool.shutdown(wait=False, cancel_futures=True)
+            self._parser_pool = create_parse_executor(self.index_workers)
+            warmup_parse_executor(self._parser_pool, self.index_workers)
+        executor = self._parser_pool
 
         def target() -> None:
             summary = run_index(
@@ -139,31 +154,53 @@ class CsigApp(App[None]):
                 workers=self.index_workers,
                 progress_cb=self._on_index_progress,
                 cancel_event=self.cancel_event,
+                executor=executor,
             )
-            self.call_from_thread(self._on_index_finished, summary)
+            if summary.get("executor_error"):
+                self._parser_pool_failed = True
+            if self._closing:
+                return
+            try:
+                self.call_from_thread(self._on_index_finished, summary)
+            except Exception:
+                # The app shut down while the run was finishing.
+                return
 
         self._index_thread = threading.Thread(target=target, name="csig-tui-index", daemon=True)
         self._index_thread.start()
 
     def _on_index_finished(self, summary: Dict[str, Any]) -> None:
         status = self.query_one("#status", Static)
-        status.update(
+        text = (
             f"Root: {self.root} | Indexed={summary.get('files_indexed', 0)} "
             f"Skipped={summary.get('files_skipped', 0)} Failed={summary.get('files_failed', 0)}"
         )
-
-    async def on_input_changed(self, event: Input.Changed) -> None:
-        if self._search_task and not self._search_task.done():
-            self._search_task.cancel()
-        self._search_task = asyncio.create_task(self._debounced_search(event.value))
-
-    async def _debounced_search(self, query_text: str) -> None:
-        try:
-            await asyncio.sleep(0.25)
-        except asyncio.CancelledError:
-            return
+        if summary.get("executor_error"):
+            text += f" | Parser pool failed, restarted on the next run: {summary['executor_error']}"
+        status.update(text)
+
+    def on_input_changed(self, event: Input.Changed) -> None:
+        if self._debounce_timer is not None:
+            self._debounce_timer.stop()
+        self._search_generation += 1
+        generation = self._search_generation
+        query_text = event.value
+        self._debounce_timer = self.set_timer(0.25, lambda: self._run_search(query_text, generation))
+
+    async def _run_search(self, query_text: str, generation: int) -> None:
         rows = await asyncio.to_thread(self._search_sync, query_text)
-        self._render_results(rows)
+        if generation == self._search_generation:
+            self._render_results(rows)
+
+    def _clang_index(self) -> cindex.Index | None:
+        # Only the clang normaliser needs an Index; it is created once per app.
+        if not use_clang_normaliser():
+            return None
+        with self._search_clang_lock:
+            if self._search_clang_index is None:
+                configure_libclang_from_env()
+                self._search_clang_index = cindex.Index.create()
+        return self._search_clang_index
 
     def _search_sync(self, query_text: str) -> List[Dict[str, Any]]:
         value = query_text.strip()
@@ -171,15 +208,13 @@ class CsigApp(App[None]):
             return []
 
         try:
-            configure_libclang_from_env()
-            clang_index = cindex.Index.create()
-            query = parse_query(value, clang_index)
-            db = open_db(self.db_path)
-            try:
-                candidates = fetch_candidates(db, query, limit=300)
-            finally:
-                db.close()
-            return _rank_candidates(candidates, query, top=50)
+            # Parsing never touches the DB, so it runs outside the connection lock.
+            query = parse_query(value, self._clang_index())
+            with self._search_db_lock:
+                if self._search_db is None:
+                    return []
+                # Already ranked by fetch_candidates.
+                return fetch_candidates(self._search_db, query, limit=50)
         except Exception as exc:
             return [{"error": str(exc)}]
 
@@ -1,6 +1,11 @@
+import os
+import random
+import sqlite3
 import threading
 import time
 import types
+from concurrent.futures import Executor, Future
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 
 import csig
@@ -25,7 +30,40 @@ def test_levenshtein_distance_case_insensitive_ascii():
     assert csig.levenshtein_distance("kitten", "sitting") == 3
 
 
+def test_levenshtein_distance_pure_python_fallback(monkeypatch):
+    monkeypatch.setattr(csig_core, "_rf_levenshtein", False)
+    csig_core.clear_levenshtein_cache()
+    assert csig.levenshtein_distance("Foo", "foo") == 0
+    assert csig.levenshtein_distance("abc", "") == 3
+    assert csig.levenshtein_distance("kitten", "sitting") == 3
+    assert csig.levenshtein_distance("int ( int )", "int ( int , int )") == 6
+    assert csig.levenshtein_distance("int ( int )", "int ( int , int )", max_dist=2) == 3
+    assert csig.levenshtein_distance("kitten", "sitting", max_dist=3) == 3
+
+
+def test_levenshtein_myers_matches_dp(monkeypatch):
+    rng = random.Random(1234)
+    pairs = [
+        (
+            bytes(rng.choice(b"ab(),* ") for _ in range(rng.randint(1, 64))),
+            bytes(rng.choice(b"ab(),* ") for _ in range(rng.randint(1, 80))),
+        )
+        for _ in range(500)
+    ]
+    expected = [csig_core._levenshtein_myers(a, b, 80) for a, b in pairs]
+    small = [(a[:8], b) for a, b in pairs]
+
+    assert [csig_core._levenshtein_small(a, b, 80) for a, b in small] == [
+        csig_core._levenshtein_myers(a, b, 80) for a, b in small
+    ]
+
+    assert [csig_core._levenshtein_dp(a, b, 80) for a, b in pairs] == expected
+    monkeypatch.setattr(csig_core, "_native_dp_kernel", False)
+    assert [csig_core._levenshtein_dp(a, b, 80) for a, b in pairs] == expected
+
+
 def test_parse_query_builds_fake_signature_and_strips_q_name(monkeypatch):
+    monkeypatch.setenv("CSIG_CLANG_NORMALISE", "1")
     captured = []
 
     def fake_normalise(index, query_string):
@@ -57,6 +95,8 @@ def test_parse_query_with_name_and_empty_signature(monkeypatch):
 
 
 def test_function_normalised_signature_uses_param_types(monkeypatch):
+    monkeypatch.setenv("CSIG_CLANG_NORMALISE", "1")
+
     def fake_normalise(index, query_string):
         assert query_string == "int __f__(int, const char *);"
         return "int __f__ ( int , const char * ) ;"
@@ -71,6 +111,46 @@ def test_function_normalised_signature_uses_param_types(monkeypatch):
     assert fn.normalised_signature(index=object()) == "int ( int , const char * )"
 
 
+def test_normalise_signatures_batched_splits_on_markers(monkeypatch):
+    captured = []
+
+    def fake_normalise(index, query_string, language):
+        captured.append((query_string, language))
+        return "int __f0__ ( int ) ; void __f1__ ( const char * , ... ) ;"
+
+    monkeypatch.setattr(csig_core, "normalise_signature_with_language", fake_normalise)
+    functions = [
+        _function_for_test("x.c", "a"),
+        _function_for_test("x.c", "b"),
+    ]
+    functions[0].parameters = [("int", "n")]
+    functions[1].return_type = "void"
+    functions[1].parameters = [("const char *", "fmt")]
+    functions[1].is_variadic = True
+
+    assert csig_core.normalise_signatures_batched(object(), functions) == [
+        "int ( int )",
+        "void ( const char * , ... )",
+    ]
+    assert captured == [("int __f0__(int);\nvoid __f1__(const char *, ...);", "c")]
+
+    monkeypatch.setattr(csig_core, "normalise_signature_with_language", lambda index, text, language: "int __f0__ ;")
+    assert csig_core.normalise_signatures_batched(object(), functions) is None
+
+
+def test_parse_query_tokenizes_without_libclang(monkeypatch):
+    monkeypatch.delenv("CSIG_CLANG_NORMALISE", raising=False)
+
+    def fail_normalise(index, query_string):
+        raise AssertionError("libclang tokenizer must not be used")
+
+    monkeypatch.setattr(csig_core, "normalise_signature", fail_normalise)
+    query = csig.parse_query("add :: static unsigned int (const char*, int[] /* n */, ...)", index=object())
+
+    assert query.name == "add"
+    assert query.normalised_signature == "unsigned ( const char * , int [ ] , ... )"
+
+
 def test_score_function_combines_name_and_signature(monkeypatch):
     def fake_normalised_signature(self, index):
         return "int ( int )"
@@ -114,10 +194,56 @@ def test_init_db_creates_schema(tmp_path):
     try:
         rows = db.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
         names = {str(row["name"]) for row in rows}
+        page_size = db.execute("PRAGMA page_size").fetchone()[0]
+        journal_mode = db.execute("PRAGMA journal_mode").fetchone()[0]
     finally:
         db.close()
     assert "files" in names
     assert "functions" in names
+    assert int(page_size) == 8192
+    assert str(journal_mode).lower() == "wal"
+
+
+def test_init_db_migrates_lowercase_columns(tmp_path):
+    db_path = tmp_path / "legacy.sqlite3"
+    legacy = sqlite3.connect(str(db_path))
+    legacy.executescript(
+        """
+        CREATE TABLE files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT NOT NULL UNIQUE, mtime REAL NOT NULL,
+            size INTEGER NOT NULL, parsed_at REAL, last_error TEXT
+        );
+        CREATE TABLE functions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, file_id INTEGER NOT NULL, name TEXT NOT NULL,
+            return_type TEXT NOT NULL, params_json TEXT NOT NULL, signature_norm TEXT NOT NULL,
+            line INTEGER NOT NULL, column INTEGER NOT NULL
+        );
+        INSERT INTO files(path, mtime, size) VALUES ('A.c', 1.0, 10);
+        INSERT INTO functions(file_id, name, return_type, params_json, signature_norm, line, column)
+        VALUES (1, 'Add', 'int', '[["int", "x"]]', 'INT ( int )', 1, 1);
+        INSERT INTO files(path, mtime, size) VALUES ('Ü.c', 1.0, 10);
+        INSERT INTO functions(file_id, name, return_type, params_json, signature_norm, line, column)
+        VALUES (2, 'ÄNDERN', 'int', '[]', 'int ( )', 1, 1);
+        """
+    )
+    legacy.close()
+
+    csig_db.init_db(db_path)
+    db = csig_db.open_db(db_path)
+    try:
+        rows = csig_db.fetch_candidates(db, csig.Query(name="add", normalised_signature=None), limit=5)
+        unicode_row = db.execute(
+            "SELECT f.name_lc, fi.path_lc FROM functions AS f JOIN files AS fi ON fi.id = f.file_id WHERE f.id = 2"
+        ).fetchone()
+    finally:
+        db.close()
+
+    # Non-ASCII identifiers fold the same way as rows indexed with str.lower().
+    assert tuple(unicode_row) == ("ändern", "ü.c")
+
+    assert [(row["name_lc"], row["signature_norm_lc"], row["path_lc"], row["params"]) for row in rows] == [
+        ("add", "int ( int )", "a.c", [("int", "x")])
+    ]
 
 
 def test_replace_functions_for_file_overwrites_old_rows(tmp_path):
@@ -172,6 +298,93 @@ def test_rank_candidates_stable_top_n(tmp_path):
     assert top1[0]["name"] == top1_again[0]["name"]
 
 
+def test_params_blob_roundtrip_and_legacy_json():
+    params = [("const char *", "s"), ("int", None), ("void (*)(int)", "cb")]
+    assert csig_db._decode_params(csig_db._encode_params(params)) == params
+    assert csig_db._decode_params(csig_db._encode_params([])) == []
+    assert csig_db._decode_params('[["int", "x"], ["char *", null]]') == [("int", "x"), ("char *", None)]
+
+
+def test_fetch_candidates_orders_by_distance_in_sql(tmp_path):
+    db_path = tmp_path / "index.sqlite3"
+    csig_db.init_db(db_path)
+    db = csig_db.open_db(db_path)
+    try:
+        file_id = csig_db.get_or_create_file(db, "a.c", mtime=1.0, size=10)
+        csig_db.replace_functions_for_file(
+            db,
+            file_id,
+            [_function_for_test("a.c", "aad_long_name"), _function_for_test("a.c", "zad", line=2)],
+        )
+        db.commit()
+        closest = csig_db.fetch_candidates(db, csig.Query(name="zad", normalised_signature=None), limit=1)
+        unfiltered = csig_db.fetch_candidates(db, csig.Query(name=None, normalised_signature=None), limit=5)
+    finally:
+        db.close()
+
+    assert [row["name"] for row in closest] == ["zad"]
+    assert [row["name"] for row in unfiltered] == ["aad_long_name", "zad"]
+
+
+def test_fetch_candidates_uses_fts_then_like_fallback(tmp_path):
+    db_path = tmp_path / "index.sqlite3"
+    csig_db.init_db(db_path)
+    db = csig_db.open_db(db_path)
+    try:
+        file_id = csig_db.get_or_create_file(db, "a.c", mtime=1.0, size=10)
+        csig_db.replace_functions_for_file(
+            db,
+            file_id,
+            [
+                _function_for_test("a.c", "add_numbers"),
+                _function_for_test("a.c", "xadd", line=2),
+                _function_for_test("a.c", "uadd", line=3),
+                _function_for_test("a.c", "mul", line=4),
+            ],
+        )
+        db.commit()
+        prefix = csig_db.fetch_candidates(db, csig.Query(name="add", normalised_signature=None), limit=5)
+        with_sig = csig_db.fetch_candidates(
+            db, csig.Query(name="add", normalised_signature="int ( int )"), limit=5
+        )
+        substring = csig_db.fetch_candidates(db, csig.Query(name="dd", normalised_signature=None), limit=5)
+
+        csig_db.replace_functions_for_file(db, file_id, [_function_for_test("a.c", "sub")])
+        db.commit()
+        after_replace = csig_db.fetch_candidates(db, csig.Query(name="add", normalised_signature=None), limit=5)
+    finally:
+        db.close()
+
+    # FTS prefix hits and name substrings ("uadd" is a single token) compete inside one LIMIT.
+    assert [row["name"] for row in prefix] == ["uadd", "xadd", "add_numbers"]
+    assert [row["name"] for row in with_sig] == ["uadd", "xadd", "mul", "add_numbers"]
+    assert sorted(row["name"] for row in substring) == ["add_numbers", "uadd", "xadd"]
+    assert [row["name"] for row in after_replace] == ["sub"]
+
+
+def test_rank_candidates_rapidfuzz_matches_python_fallback(monkeypatch):
+    candidates = [
+        {"name": name, "path": path, "line": line, "column": 1, "signature_norm": sig}
+        for name, path, line, sig in [
+            ("add", "b.c", 3, "int ( int , int )"),
+            ("Add", "a.c", 7, "int ( int , int )"),
+            ("add", "a.c", 2, "int ( int , int )"),
+            ("sub", "a.c", 1, "int ( int , int )"),
+            ("adder", "c.c", 1, "long ( long )"),
+            ("mul", "a.c", 4, "int ( int , int )"),
+        ]
+    ]
+    query = csig.Query(name="add", normalised_signature="int ( int , int )")
+
+    rapidfuzz_ranked = [csig.rank_candidates(candidates, query, top=top) for top in range(0, 8)]
+    monkeypatch.setattr(csig_core, "_rf_levenshtein", False)
+    csig_core.clear_levenshtein_cache()
+    pure_python = [csig.rank_candidates(candidates, query, top=top) for top in range(0, 8)]
+
+    assert rapidfuzz_ranked == pure_python
+    assert [(row["path"], row["line"]) for row in rapidfuzz_ranked[3]] == [("a.c", 2), ("a.c", 7), ("b.c", 3)]
+
+
 def test_indexer_skips_unchanged_files_by_mtime_and_size(tmp_path, monkeypatch):
     root = tmp_path / "src"
     root.mkdir()
@@ -191,11 +404,162 @@ def test_indexer_skips_unchanged_files_by_mtime_and_size(tmp_path, monkeypatch):
 
     assert first["files_total"] == 2
     assert first["files_indexed"] == 2
+
+    db = csig_db.open_db(db_path)
+    try:
+        rows = db.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger')").fetchall()
+        index_names = {str(row["name"]) for row in rows}
+        fts_rows = db.execute("SELECT rowid FROM functions_fts WHERE functions_fts MATCH 'b'").fetchall()
+    finally:
+        db.close()
+    assert {"idx_functions_name", "idx_functions_sig", "idx_functions_file_id"} <= index_names
+    # The first run loads with the FTS triggers dropped and rebuilds functions_fts at the end.
+    assert {"functions_fts_ai", "functions_fts_ad", "functions_fts_au"} <= index_names
+    assert len(fts_rows) == 1
     assert second["files_total"] == 2
     assert second["files_skipped"] == 2
     assert second["files_indexed"] == 0
 
 
+def test_indexer_state_keys_handle_hardlinks_and_renames(tmp_path, monkeypatch):
+    root = tmp_path / "src"
+    root.mkdir()
+    (root / "a.c").write_text("int a(void){return 1;}\n", encoding="utf-8")
+    db_path = tmp_path / "idx.sqlite3"
+
+    def fake_parse(path, mtime, size, index):
+        del mtime, size, index
+        return [_function_for_test(path, Path(path).stem)], None
+
+    monkeypatch.setattr(csig_indexer, "parse_source_file", fake_parse)
+    csig_indexer.run_index(str(root), str(db_path), workers=1)
+
+    os.link(root / "a.c", root / "b.c")
+    linked = csig_indexer.run_index(str(root), str(db_path), workers=1)
+    again = csig_indexer.run_index(str(root), str(db_path), workers=1)
+    (root / "a.c").rename(root / "c.c")
+    renamed = csig_indexer.run_index(str(root), str(db_path), workers=1)
+
+    assert (linked["files_indexed"], linked["files_skipped"]) == (1, 1)
+    assert (again["files_indexed"], again["files_skipped"]) == (0, 2)
+    assert (renamed["files_indexed"], renamed["files_skipped"]) == (1, 1)
+
+
+def test_needs_refresh_tracks_mtime_and_file_count(tmp_path, monkeypatch):
+    root = tmp_path / "src"
+    root.mkdir()
+    (root / "a.c").write_text("int a(void);\n", encoding="utf-8")
+    db_path = tmp_path / "idx.sqlite3"
+
+    def fake_parse(path, mtime, size, index):
+        del mtime, size, index
+        return [_function_for_test(path, Path(path).stem)], None
+
+    monkeypatch.setattr(csig_indexer, "parse_source_file", fake_parse)
+
+    assert csig_indexer.needs_refresh(str(root), str(db_path)) is True
+    csig_indexer.run_index(str(root), str(db_path), workers=1)
+    assert csig_indexer.needs_refresh(str(root), str(db_path)) is False
+
+    (root / "b.h").write_text("int b(void);\n", encoding="utf-8")
+    os.utime(root / "b.h", (1.0, 1.0))
+    assert csig_indexer.needs_refresh(str(root), str(db_path)) is True
+    csig_indexer.run_index(str(root), str(db_path), workers=1)
+    assert csig_indexer.needs_refresh(str(root), str(db_path)) is False
+
+    stat = (root / "a.c").stat()
+    os.utime(root / "a.c", (stat.st_atime, stat.st_mtime + 10))
+    assert csig_indexer.needs_refresh(str(root), str(db_path)) is True
+    csig_indexer.run_index(str(root), str(db_path), workers=1)
+    assert csig_indexer.needs_refresh(str(root), str(db_path)) is False
+
+    # Only a completed run vouches for the tree: a canceled one may have skipped edits.
+    cancel_event = threading.Event()
+    cancel_event.set()
+    canceled = csig_indexer.run_index(str(root), str(db_path), workers=1, cancel_event=cancel_event)
+    assert canceled["canceled"] is True
+    assert csig_indexer.needs_refresh(str(root), str(db_path)) is True
+
+
+def test_indexer_reparses_everything_when_normaliser_changes(tmp_path, monkeypatch):
+    root = tmp_path / "src"
+    root.mkdir()
+    (root / "a.c").write_text("int a(void);\n", encoding="utf-8")
+    (root / "b.c").write_text("int b(void);\n", encoding="utf-8")
+    db_path = tmp_path / "idx.sqlite3"
+
+    def fake_parse(path, mtime, size, index):
+        del mtime, size, index
+        return [_function_for_test(path, Path(path).stem)], None
+
+    monkeypatch.setattr(csig_indexer, "parse_source_file", fake_parse)
+    monkeypatch.delenv("CSIG_CLANG_NORMALISE", raising=False)
+    csig_indexer.run_index(str(root), str(db_path), workers=1)
+    assert csig_indexer.needs_refresh(str(root), str(db_path)) is False
+
+    monkeypatch.setenv("CSIG_CLANG_NORMALISE", "1")
+    assert csig_indexer.needs_refresh(str(root), str(db_path)) is True
+    switched = csig_indexer.run_index(str(root), str(db_path), workers=1)
+    again = csig_indexer.run_index(str(root), str(db_path), workers=1)
+
+    monkeypatch.delenv("CSIG_CLANG_NORMALISE")
+    monkeypatch.setattr(csig_core, "_NORMALISER_VERSION", csig_core._NORMALISER_VERSION + 1)
+    bumped = csig_indexer.run_index(str(root), str(db_path), workers=1)
+
+    assert (switched["files_indexed"], switched["files_skipped"]) == (2, 0)
+    assert (again["files_indexed"], again["files_skipped"]) == (0, 2)
+    assert (bumped["files_indexed"], bumped["files_skipped"]) == (2, 0)
+    assert csig_indexer.needs_refresh(str(root), str(db_path)) is False
+
+
+def test_header_language_candidates_sniff_cpp(tmp_path):
+    c_header = tmp_path / "a.h"
+    c_header.write_text("int add(int a, int b);\n", encoding="utf-8")
+    cpp_header = tmp_path / "b.h"
+    cpp_header.write_text("namespace n { int add(int a, int b); }\n", encoding="utf-8")
+
+    assert csig_indexer._language_candidates_for_path(str(c_header)) == ["c", "c++"]
+    assert csig_indexer._language_candidates_for_path(str(cpp_header)) == ["c++", "c"]
+    assert csig_indexer._language_candidates_for_path(str(tmp_path / "x.cpp")) == ["c++"]
+
+
+def test_pch_headers_opt_in(monkeypatch):
+    monkeypatch.delenv("CSIG_PCH_HEADERS", raising=False)
+    assert csig_indexer._precompiled_preamble(None, "c") is None
+
+    monkeypatch.setenv("CSIG_PCH_HEADERS", " stdio.h, ,stdlib.h ")
+    assert csig_indexer._pch_headers() == ("stdio.h", "stdlib.h")
+
+
+def test_task_deques_deliver_every_task_once():
+    workers = 4
+    tasks = csig_indexer._TaskDeques(workers, maxsize=8)
+    seen = [[] for _ in range(workers)]
+
+    def consume(worker_idx):
+        while True:
+            task = tasks.get(worker_idx)
+            if task is None:
+                return
+            seen[worker_idx].append(task[0])
+            if worker_idx == 0:
+                # A slow worker: the others must steal what was dealt to it.
+                time.sleep(0.001)
+
+    threads = [threading.Thread(target=consume, args=(idx,)) for idx in range(workers)]
+    for thread in threads:
+        thread.start()
+    for idx in range(200):
+        tasks.put((f"f{idx}.c", 0.0, 0))
+    tasks.close()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert sorted(path for paths in seen for path in paths) == sorted(f"f{idx}.c" for idx in range(200))
+    assert len(seen[0]) < 50
+
+
 def test_indexer_cancel_stops_processing_and_returns(tmp_path, monkeypatch):
     root = tmp_path / "src"
     root.mkdir()
@@ -224,3 +588,124 @@ def test_indexer_cancel_stops_processing_and_returns(tmp_path, monkeypatch):
 
     assert summary["canceled"] is True
     assert int(summary["files_done"]) < int(summary["files_total"])
+
+
+def test_indexer_broken_parser_pool_leaves_files_for_retry(tmp_path, monkeypatch):
+    root = tmp_path / "src"
+    root.mkdir()
+    for name in ("a", "b", "c"):
+        (root / f"{name}.c").write_text(f"int {name}(void){{return 0;}}\n", encoding="utf-8")
+    db_path = tmp_path / "idx.sqlite3"
+
+    class BrokenExecutor(Executor):
+        def submit(self, fn, *args, **kwargs):
+            future = Future()
+            future.set_exception(BrokenProcessPool("a child process terminated abruptly"))
+            return future
+
+    broken = csig_indexer.run_index(str(root), str(db_path), workers=2, executor=BrokenExecutor())
+
+    db = csig_db.open_db(db_path)
+    try:
+        errors = db.execute("SELECT COUNT(*) FROM files WHERE last_error IS NOT NULL").fetchone()[0]
+    finally:
+        db.close()
+    assert broken["canceled"] is True
+    assert "BrokenProcessPool" in broken["executor_error"]
+    assert broken["files_failed"] == 0
+    assert errors == 0
+
+    def fake_parse(path, mtime, size, index):
+        del mtime, size, index
+        return [_function_for_test(path, Path(path).stem)], None
+
+    monkeypatch.setattr(csig_indexer, "parse_source_file", fake_parse)
+    healthy = csig_indexer.run_index(str(root), str(db_path), workers=2)
+    assert (healthy["files_indexed"], healthy["files_skipped"]) == (3, 0)
+
+
+def test_indexer_writer_does_not_hold_lock_between_results(tmp_path, monkeypatch):
+    root = tmp_path / "src"
+    root.mkdir()
+    for idx in range(30):
+        (root / f"f{idx}.c").write_text("int f(void){return 0;}\n", encoding="utf-8")
+    db_path = tmp_path / "idx.sqlite3"
+    started = threading.Event()
+
+    def fake_parse(path, mtime, size, index):
+        del mtime, size, index
+        time.sleep(0.03)
+        return [_function_for_test(path, Path(path).stem)], None
+
+    def progress_cb(snapshot):
+        if int(snapshot.get("files_done", 0)) >= 1:
+            started.set()
+
+    monkeypatch.setattr(csig_indexer, "parse_source_file", fake_parse)
+    summary: dict = {}
+    thread = threading.Thread(
+        target=lambda: summary.update(
+            csig_indexer.run_index(str(root), str(db_path), workers=1, progress_cb=progress_cb)
+        )
+    )
+    thread.start()
+    assert started.wait(5)
+
+    # Another writer gets the lock while the indexer waits for parse results.
+    acquired = False
+    other = sqlite3.connect(str(db_path), timeout=0, isolation_level=None)
+    try:
+        for _ in range(50):
+            try:
+                other.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError:
+                time.sleep(0.01)
+                continue
+            other.execute("ROLLBACK")
+            acquired = True
+            break
+    finally:
+        other.close()
+    thread.join()
+
+    assert acquired
+    assert summary["canceled"] is False
+    assert summary["files_indexed"] == 30
+
+
+def test_lazy_parse_executor_starts_pool_only_for_larger_runs(monkeypatch):
+    created = []
+
+    class FakePool:
+        def shutdown(self, wait=True, cancel_futures=False):
+            created.remove(self)
+
+    def fake_create(workers):
+        created.append(FakePool())
+        return created[-1]
+
+    monkeypatch.setattr(csig_indexer, "create_parse_executor", fake_create)
+    tracker = csig_indexer._ProgressTracker(None)
+    lazy = csig_indexer._LazyParseExecutor(2, 4, tracker)
+
+    tracker.inc(files_queued=4)
+    assert lazy.get() is None
+    tracker.inc(files_queued=1)
+    pool = lazy.get()
+    assert pool is not None and lazy.get() is pool and len(created) == 1
+    lazy.shutdown()
+    assert created == []
+
+
+def test_iter_source_entries_checks_cancel_per_entry(tmp_path):
+    for idx in range(50):
+        (tmp_path / f"f{idx}.c").write_text("", encoding="utf-8")
+    cancel_event = threading.Event()
+
+    seen = 0
+    for _entry, _stat in csig_indexer._iter_source_entries(str(tmp_path), cancel_event):
+        seen += 1
+        if seen == 3:
+            cancel_event.set()
+
+    assert seen == 3